@@ -3,6 +3,7 @@ var tridentFrontend = function () {
   const topoListUrl = '/topologylist.json';
   const setTopologyUrl = '/topology/{0}.json';
   const queryUrl = '/query';
+  const eventsUrl = '/events';
 
   var config = {
     margin: 15,
@@ -252,22 +253,98 @@ var tridentFrontend = function () {
     selected: []
   };
 
+  var currentTopology = null;
+
   function dispatch(results) {
     results.forEach(function (result, index){
       if (result.type == 'path') {
         updatePath(result.expr, result.path);
       } else if (result.type == 'topology') {
+        currentTopology = result.name;
         initializeGraph(result.topology);
+      } else if (result.type == 'plan' || result.type == 'profile') {
+        console.log(result.expr, result);
+      }
+    });
+  }
+
+  function updateValues(delta) {
+    if (delta.topology != currentTopology) {
+      return;
+    }
+    const elements = (delta.element_type == 'NODE') ? nodes : links;
+    elements.forEach(function (element, index) {
+      const value = delta.values[element.id];
+      if (value === undefined) {
+        return;
+      }
+      if (!(delta.property in element.properties)) {
+        element.proplist.push(delta.property);
+      }
+      element.properties[delta.property] = value;
+    });
+  }
+
+  function subscribe() {
+    // WATCH results and SET values pushed by the server. The browser
+    // reconnects by itself when the stream breaks.
+    const source = new EventSource(eventsUrl);
+    source.addEventListener('path', function (e) {
+      const result = JSON.parse(e.data);
+      if (result.expr == currentQuery.expr) {
+        updatePath(result.expr, result.path);
       }
     });
+    source.addEventListener('delta', e => updateValues(JSON.parse(e.data)));
+    source.addEventListener('resync', e => console.log('missed some updates'));
+    return source;
   }
 
   function query(expr) {
+    // Results arrive one per line as the server finds them. Only the first
+    // path of each expression is drawn, the alternates of a LIMIT are logged.
+    const drawn = new Set();
+    const decoder = new TextDecoder();
+    var pending = '';
+
+    function receive(line) {
+      if (line.trim() == '') {
+        return;
+      }
+      const result = JSON.parse(line);
+      if (result.type == 'path' && drawn.has(result.expr)) {
+        console.log('alternate path', result.path);
+        return;
+      }
+      if (result.type == 'path') {
+        drawn.add(result.expr);
+      } else if (result.type == 'error') {
+        console.log(result.message);
+      }
+      dispatch([result]);
+    }
+
     fetch(queryUrl, {
       body: expr,
-      method: 'POST'
-    }).then(r => r.json())
-      .then(results => dispatch(results));
+      method: 'POST',
+      headers: {'Accept': 'application/x-ndjson'}
+    }).then(function (r) {
+      const reader = r.body.getReader();
+      function read() {
+        return reader.read().then(function (chunk) {
+          if (chunk.done) {
+            receive(pending);
+            return;
+          }
+          pending += decoder.decode(chunk.value, {stream: true});
+          const lines = pending.split('\n');
+          pending = lines.pop();
+          lines.forEach(receive);
+          return read();
+        });
+      }
+      return read();
+    });
   }
 
   return {
@@ -275,6 +352,7 @@ var tridentFrontend = function () {
     prepareTopologyList: prepareTopologyList,
     initializeGraph: initializeGraph,
     setTopology: setTopology,
+    subscribe: subscribe,
     query: query
   };
 
@@ -283,6 +361,7 @@ var tridentFrontend = function () {
 tridentFrontend.config.width = $('svg').width();
 tridentFrontend.config.height = $('svg').height();
 tridentFrontend.prepareTopologyList();
+tridentFrontend.subscribe();
 
 function submitQuery() {
   const expr = $('textarea')[0].value;
@@ -1,13 +1,95 @@
 #!/usr/bin/env python3
 
-from flask import Flask, send_file, request
+from flask import Flask, Response, abort, g, send_file, request, stream_with_context
 import networkx as nx
 import json
+import math
+import os
 
 from trident.demo import TridentDemo
+from trident.rql.compiler import RqlCompiler
+from trident.scheduler import Scheduler
+from trident.sessions import SessionManager
 
 app = Flask(__name__)
 
+SESSION_COOKIE = 'trident_session'
+SESSION_HEADER = 'X-Trident-Session'
+DEADLINE_HEADER = 'X-Trident-Deadline'
+
+def setup(topo_dir, larkfile, workers=0, oracles=(), timeout=1800, threads=4, queue=16,
+          deadline=60):
+    app.config['TOPO_DIR'] = topo_dir
+    app.scheduler = Scheduler(threads, queue, deadline)
+    compiler = RqlCompiler(larkfile)
+    executor = None
+    if workers > 0:
+        from trident.rql.parallel import PathExecutor
+        executor = PathExecutor(workers)
+    app.sessions = SessionManager(lambda: TridentDemo(topo_dir, compiler, executor, oracles),
+                                  timeout)
+
+def oracles():
+    return [c for c in os.environ.get('TRIDENT_ORACLES', '').split(',') if c != '']
+
+def settings():
+    env = os.environ.get
+    deadline = float(env('TRIDENT_DEADLINE', '60'))
+    return dict(workers=int(env('TRIDENT_WORKERS', '0')), oracles=oracles(),
+                timeout=int(env('TRIDENT_SESSION_TIMEOUT', '1800')),
+                threads=int(env('TRIDENT_THREADS', '4')), queue=int(env('TRIDENT_QUEUE', '16')),
+                deadline=deadline if deadline > 0 else None)
+
+def client():
+    # The session of the client, from its header or cookie. New clients
+    # get a session, and its token is sent back with the response.
+    token = request.headers.get(SESSION_HEADER, None) or request.cookies.get(SESSION_COOKIE, None)
+    g.token, trident = app.sessions.get(token)
+    return trident
+
+@app.after_request
+def remember_session(response):
+    token = g.get('token', None)
+    if token is not None:
+        response.set_cookie(SESSION_COOKIE, token, httponly=True, samesite='Strict')
+        response.headers[SESSION_HEADER] = token
+    return response
+
+def failure(status, message, headers=None):
+    error = {'type': 'error', 'message': message}
+    if request.accept_mimetypes.best == 'application/x-ndjson':
+        return Response(json.dumps(error) + '\n', status=status, headers=headers,
+                        mimetype='application/x-ndjson')
+    return Response(json.dumps([error]), status=status, headers=headers,
+                    mimetype='application/json')
+
+def requested_timeout():
+    # The deadline the client asked for in seconds, if any
+    timeout = request.headers.get(DEADLINE_HEADER, None)
+    if timeout is None:
+        return None
+    try:
+        timeout = float(timeout)
+    except ValueError:
+        timeout = math.nan
+    if not (math.isfinite(timeout) and timeout > 0):
+        abort(failure(400, 'Bad %s: %s' % (DEADLINE_HEADER, request.headers[DEADLINE_HEADER])))
+    return timeout
+
+def schedule(results):
+    # Runs a query on the scheduler, within the deadline the client asked
+    # for, if any. Returns the job, or None when the server is too busy to
+    # take it.
+    return app.scheduler.submit(results, requested_timeout())
+
+def busy():
+    return failure(503, 'Too many queries, try again later', {'Retry-After': '1'})
+
+def finish(job, retval):
+    # 504 when the query ran out of time
+    status = 504 if job.deadline.exceeded else 200
+    return Response(json.dumps(retval), status=status, mimetype='application/json')
+
 @app.route('/demo.html')
 def demo():
     filename = 'demo.html'
@@ -22,27 +104,65 @@ def assets(dir_name, name):
 @app.route('/topologylist.json')
 def get_topology_list():
     import glob
-    file_list = glob.glob('%s/*.graphml' % topo_dir)
+    file_list = glob.glob('%s/*.graphml' % app.config['TOPO_DIR'])
     topo_list = sorted(map(lambda f: f.split('/')[-1].split('.')[0], file_list))
     return json.dumps(list(topo_list))
 
 @app.route('/topology/<name>.json')
 def load_topology(name):
-    app.trident.query('LOAD %s AS %s' % (name, name))
-    retval = app.trident.query('SHOW %s' % (name))
+    trident = client()
+    def show():
+        trident.query('LOAD %s AS %s' % (name, name))
+        return trident.results('SHOW %s' % (name))
+    job = schedule(show)
+    if job is None:
+        return busy()
+    retval = list(job.results())
     print(retval)
-    return json.dumps(retval)
+    return finish(job, retval)
 
 @app.route('/query', methods=['POST'])
 def query():
     data = request.data
     expr = str(data, 'UTF-8')
-    retval = app.trident.query(expr)
-    return json.dumps(retval)
+    trident = client()
+    job = schedule(lambda: trident.results(expr))
+    if job is None:
+        return busy()
+    if request.accept_mimetypes.best == 'application/x-ndjson':
+        # One result per line, sent as soon as it is found
+        results = (json.dumps(r) + '\n' for r in job.results())
+        return Response(stream_with_context(results), mimetype='application/x-ndjson')
+    return finish(job, list(job.results()))
+
+@app.route('/batch', methods=['POST'])
+def batch():
+    # A JSON list of scripts and {"select": ..., "params": [...]} items
+    items = request.get_json(force=True)
+    trident = client()
+    job = schedule(lambda: trident.batch(items))
+    if job is None:
+        return busy()
+    return finish(job, list(job.results()))
+
+@app.route('/events')
+def events():
+    hub = client().events
+    stream = hub.stream(hub.subscribe())
+    return Response(stream_with_context(stream), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 
+# Allows running under a WSGI server, e.g.
+# TRIDENT_TOPO_DIR=dataset/sources TRIDENT_LARKFILE=trident/rql.lark gunicorn --threads 16 demo:app
+# Sessions live in the memory of one process, so several worker processes
+# (-w) need sticky routing of every client to the same process.
+if 'TRIDENT_TOPO_DIR' in os.environ:
+    setup(os.environ['TRIDENT_TOPO_DIR'],
+          os.environ.get('TRIDENT_LARKFILE', 'trident/rql.lark'), **settings())
 
 if __name__ == '__main__':
     import sys
-    topo_dir, larkfile = sys.argv[1:]
-    app.trident = TridentDemo(topo_dir, larkfile)
-    app.run(host='0.0.0.0', debug=True)
+    topo_dir, larkfile = sys.argv[1:3]
+    setup(topo_dir, larkfile, **settings())
+    app.run(host='0.0.0.0', debug=True, threaded=True)
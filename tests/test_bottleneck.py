@@ -0,0 +1,74 @@
+from trident.rql.bottleneck import BottleneckSearch
+from trident.rql.graph import Structure
+from trident.rql.paths import INF
+
+import networkx as nx
+import numpy as np
+import pytest
+import random
+
+def search(accum_func):
+    # a - b - c - d, with a link capacity of 10, 5 and 20
+    nodes = ['a', 'b', 'c', 'd']
+    sources = np.array([0, 1, 2], dtype=np.int64)
+    targets = np.array([1, 2, 3], dtype=np.int64)
+    csr = Structure(nodes, sources, targets).compressed()
+    weights = np.array([10.0, 5.0, 20.0])
+    return BottleneckSearch(csr, weights, accum_func, nodes, {n: i for i, n in enumerate(nodes)})
+
+def test_source_is_target():
+    s = search('min')
+    assert s.best_path(['b'], ['b']) == (INF, ['b'])
+    assert s.best_path(['a', 'b'], ['b']) == (INF, ['b'])
+    assert s.best_path(['a', 'c'], ['c', 'd']) == (INF, ['c'])
+
+def test_several_sources():
+    s = search('min')
+    assert s.best_path(['a', 'c'], ['d']) == (20.0, ['c', 'd'])
+    assert list(s.distances(['a', 'c'])) == [INF, 10.0, INF, 20.0]
+    s = search('max')
+    assert s.best_path(['a', 'd'], ['b']) == (10.0, ['a', 'b'])
+
+def brute_force(g, sources, targets, accum_func):
+    # The best threshold that still joins a source and a target, and the
+    # fewest hops over the links within it.
+    levels = sorted(set(w for _, _, w in g.edges(data='w')), reverse=(accum_func == 'min'))
+    for level in levels:
+        within = [(u, v) for u, v, w in g.edges(data='w')
+                  if (w >= level if accum_func == 'min' else w <= level)]
+        h = nx.Graph(within)
+        h.add_nodes_from(g)
+        hops = [nx.shortest_path_length(h, s, t) for s in sources for t in targets
+                if nx.has_path(h, s, t)]
+        if len(hops) > 0:
+            return level, min(hops)
+    return INF, None
+
+@pytest.mark.parametrize('accum_func', ['min', 'max'])
+def test_brute_force(accum_func):
+    rng = random.Random(7)
+    for seed in range(10):
+        g = nx.gnm_random_graph(25, 40, seed=seed)
+        nodes = list(g)
+        sources = np.array([u for u, v in g.edges()], dtype=np.int64)
+        targets = np.array([v for u, v in g.edges()], dtype=np.int64)
+        weights = np.array([float(rng.randint(1, 6)) for _ in range(len(sources))])
+        for (u, v), w in zip(g.edges(), weights):
+            g[u][v]['w'] = w
+        csr = Structure(nodes, sources, targets).compressed()
+        search = BottleneckSearch(csr, weights, accum_func, nodes, {n: i for i, n in enumerate(nodes)})
+        for _ in range(10):
+            s = rng.sample(nodes, rng.randint(1, 3))
+            t = rng.sample(nodes, rng.randint(1, 3))
+            if len(set(s) & set(t)) > 0:
+                continue
+            level, hops = brute_force(g, s, t, accum_func)
+            cost, path = search.best_path(s, t)
+            assert cost == level
+            if path is None:
+                assert hops is None
+                continue
+            assert path[0] in s and path[-1] in t
+            links = [g[u][v]['w'] for u, v in zip(path[:-1], path[1:])]
+            assert (min(links) if accum_func == 'min' else max(links)) == level
+            assert len(path) - 1 == hops
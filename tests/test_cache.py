@@ -0,0 +1,73 @@
+from trident.rql.cache import ResultCache, TopologyCache
+from trident.rql.compiler import RqlCompiler
+from trident.rql.session import RqlSession
+
+import networkx as nx
+import os
+
+LARKFILE = os.path.join(os.path.dirname(__file__), '..', 'trident', 'rql.lark')
+
+QUERY = 'OPT lat WHEN SELECT a :-: b IN t WHERE a::id = "n0" AND b::id = "n2"'
+
+def session(tmp_path, topologies, results):
+    # n0 - n1 - n2 and n0 - n3 - n4 - n2
+    g = nx.Graph()
+    g.add_edges_from([('n0', 'n1'), ('n1', 'n2'), ('n0', 'n3'), ('n3', 'n4'), ('n4', 'n2')])
+    if not (tmp_path / 'T.graphml').exists():
+        nx.write_graphml(g, str(tmp_path / 'T.graphml'))
+    s = RqlSession(str(tmp_path), cache=topologies, results=results)
+    s.compiler = RqlCompiler(LARKFILE)
+    s.run = lambda q: [r for _, r in s.execute(s.compiler.compile(q))]
+    s.run('LOAD T AS t')
+    return s
+
+def test_results_follow_versions(tmp_path):
+    results = ResultCache()
+    s = session(tmp_path, None, results)
+    s.run('DEFINE COST lat, int, 1, add FOR EACH LINK IN t')
+    assert s.run(QUERY) == [['n0', 'n1', 'n2']]
+    assert s.run(QUERY) == [['n0', 'n1', 'n2']]
+    assert results.stats()['hits'] == 1
+
+    # A SET makes a new version, whose results are searched again.
+    s.run('SET COST lat, 10 FOR EACH LINK IN t THAT source = "n0" AND target = "n1"')
+    assert s.run(QUERY) == [['n0', 'n3', 'n4', 'n2']]
+    assert results.stats() == {'size': 2, 'hits': 1, 'misses': 2}
+
+    # Variable names are not part of the key.
+    assert s.run(QUERY + ' AS p') == ['p']
+    assert s.variables['p'] == ['n0', 'n3', 'n4', 'n2']
+    assert results.stats()['hits'] == 2
+
+def test_forks_share_results(tmp_path):
+    # Forks of one cached topology have the same version until they change.
+    topologies = TopologyCache()
+    results = ResultCache()
+    s = session(tmp_path, topologies, results)
+    t = session(tmp_path, topologies, results)
+    query = QUERY.replace('OPT lat WHEN ', '')
+    assert s.run(query) == t.run(query) == [['n0', 'n1', 'n2']]
+    assert results.stats()['hits'] == 1
+    t.run('DEFINE COST lat, int, 1, add FOR EACH LINK IN t')
+    t.run('SET COST lat, 10 FOR EACH LINK IN t THAT source = "n0" AND target = "n1"')
+    assert t.run(QUERY) == [['n0', 'n3', 'n4', 'n2']]
+    assert s.run(query) == [['n0', 'n1', 'n2']]
+    assert results.stats()['hits'] == 2
+
+def test_fork_fields(tmp_path):
+    s = session(tmp_path, None, None)
+    s.run('DEFINE COST lat, int, 1, add FOR EACH LINK IN t')
+    s.run(QUERY)
+    gdb = s.variables['t']
+    for fork in [gdb.fork(), gdb.successor()]:
+        assert set(vars(fork)) == set(vars(gdb))
+        assert fork.version == gdb.version
+        assert fork.cost_specs == gdb.cost_specs and fork.cost_specs is not gdb.cost_specs
+        assert fork.edge_table is not gdb.edge_table
+
+def test_capacity():
+    results = ResultCache(capacity=2)
+    for key in ['a', 'b', 'c']:
+        results.put(key, [key])
+    assert results.get('a') is None
+    assert results.get('b') == ['b'] and results.get('c') == ['c']
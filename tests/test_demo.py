@@ -0,0 +1,38 @@
+import demo
+
+import networkx as nx
+import os
+import pytest
+
+LARKFILE = os.path.join(os.path.dirname(__file__), '..', 'trident', 'rql.lark')
+
+@pytest.fixture
+def client(tmp_path):
+    g = nx.relabel_nodes(nx.path_graph(4), lambda n: 'n%d' % n)
+    nx.write_graphml(g, str(tmp_path / 'T.graphml'))
+    demo.setup(str(tmp_path), LARKFILE, threads=1, queue=1, deadline=10)
+    yield demo.app.test_client()
+    demo.app.scheduler.pool.shutdown()
+
+@pytest.mark.parametrize('timeout', ['soon', 'nan', 'inf', '-1', '0'])
+def test_bad_deadline(client, timeout):
+    response = client.post('/query', data='LOAD T AS t', headers={demo.DEADLINE_HEADER: timeout})
+    assert response.status_code == 400
+    assert response.get_json()[0]['type'] == 'error'
+
+def test_deadline(client):
+    query = 'LOAD T AS t; SELECT a :-: b IN t WHERE a::id = "n0" AND b::id = "n3"'
+    response = client.post('/query', data=query, headers={demo.DEADLINE_HEADER: '5'})
+    assert response.status_code == 200
+    assert [r['type'] for r in response.get_json()] == ['path']
+
+def test_batch(client):
+    items = [
+        'LOAD T AS t; DEFINE COST hops, int, 1, add FOR EACH LINK IN t',
+        {'select': 'OPT hops WHEN SELECT a :-: b IN t WHERE a::id = $src AND b::id = $dst',
+         'params': [{'src': 'n0', 'dst': 'n2'}, {'src': 'n3', 'dst': 'n1'}]}
+    ]
+    response = client.post('/batch', json=items)
+    assert response.status_code == 200
+    script, selects = response.get_json()
+    assert [r['path'] for r in selects] == [[['n0', 'n1'], ['n1', 'n2']], [['n3', 'n2'], ['n2', 'n1']]]
@@ -0,0 +1,31 @@
+from trident.rql import layout
+from trident.rql.layout import LayoutCache, fallback_layout
+
+import networkx as nx
+
+def test_retry(tmp_path, monkeypatch):
+    cache = LayoutCache(str(tmp_path), retry=0)
+    g = nx.path_graph(4)
+    def fail(g):
+        raise Exception('no graphviz')
+    monkeypatch.setattr(layout, 'graphviz_layout', fail)
+    assert cache.get(g) == fallback_layout(g)
+    cache.wait(g)
+    assert len(cache.layouts) == 0
+
+    pos = {n: (float(n), 0.0) for n in g}
+    monkeypatch.setattr(layout, 'graphviz_layout', lambda g: pos)
+    cache.get(g)
+    cache.wait(g)
+    assert cache.get(g) == pos
+
+def test_capacity(tmp_path, monkeypatch):
+    cache = LayoutCache(str(tmp_path), capacity=2)
+    monkeypatch.setattr(layout, 'graphviz_layout', lambda g: {n: (0.0, 0.0) for n in g})
+    graphs = [nx.relabel_nodes(nx.path_graph(n), str) for n in range(2, 6)]
+    for g in graphs:
+        cache.prefetch(g)
+        cache.wait(g)
+    assert list(cache.layouts) == [cache.key(g) for g in graphs[-2:]]
+    # Evicted layouts are read back from the cache directory.
+    assert cache.get(graphs[0]) == {n: (0.0, 0.0) for n in graphs[0]}
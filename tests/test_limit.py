@@ -0,0 +1,58 @@
+from trident.rql.compiler import RqlCompiler
+from trident.rql.session import RqlSession
+
+from itertools import islice
+
+import networkx as nx
+import os
+import pytest
+import random
+
+LARKFILE = os.path.join(os.path.dirname(__file__), '..', 'trident', 'rql.lark')
+
+def setup(tmp_path, seed):
+    g = nx.connected_watts_strogatz_graph(20, 4, 0.4, seed=seed)
+    g = nx.relabel_nodes(g, {n: 'n%d' % n for n in g})
+    nx.write_graphml(g, str(tmp_path / 'T.graphml'))
+    compiler = RqlCompiler(LARKFILE)
+    session = RqlSession(str(tmp_path), cache=None)
+    run = lambda q: [r for _, r in session.execute(compiler.compile(q))]
+    lines = ['LOAD T AS t', 'DEFINE COST lat, int, 1, add FOR EACH LINK IN t']
+    rng = random.Random(seed)
+    for u, v in g.edges():
+        g[u][v]['lat'] = rng.randint(1, 9)
+        lines += ['SET COST lat, %d FOR EACH LINK IN t THAT (source = "%s" AND target = "%s") OR '
+                  '(source = "%s" AND target = "%s")' % (g[u][v]['lat'], u, v, v, u)]
+    run('\n'.join(lines))
+    return g, run
+
+def reference(g, sources, target, k):
+    # The costs of the k cheapest simple paths, with a virtual node in front
+    # of the sources.
+    h = g.copy()
+    for s in sources:
+        h.add_edge('source', s, lat=0)
+    paths = islice(nx.shortest_simple_paths(h, 'source', target, weight='lat'), k)
+    return [nx.path_weight(h, p, 'lat') for p in paths]
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_limit_matches_networkx(tmp_path, seed):
+    g, run = setup(tmp_path, seed)
+    rng = random.Random(seed)
+    nodes = sorted(g)
+    for k, nsources in [(1, 1), (8, 1), (8, 3)]:
+        sources = rng.sample(nodes, nsources + 1)
+        target = sources.pop()
+        where = '(%s) AND b::id = "%s"' % (' OR '.join('a::id = "%s"' % s for s in sources), target)
+        paths, = run('OPT lat WHEN SELECT a :-: b IN t WHERE %s LIMIT %d' % (where, k))
+        assert len(set(map(tuple, paths))) == len(paths)
+        for path in paths:
+            assert path[0] in sources and path[-1] == target
+            assert len(set(path)) == len(path)
+        assert [nx.path_weight(g, p, 'lat') for p in paths] == reference(g, sources, target, k)
+
+def test_limit_needs_two_waypoints(tmp_path):
+    g, run = setup(tmp_path, 1)
+    with pytest.raises(Exception):
+        run('OPT lat WHEN SELECT a :-: w :-: b IN t WHERE a::id = "n0" AND w::id = "n1" '
+            'AND b::id = "n2" LIMIT 2')
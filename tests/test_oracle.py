@@ -0,0 +1,50 @@
+from trident.rql import oracle
+from trident.rql.compiler import RqlCompiler
+from trident.rql.session import RqlSession
+
+import networkx as nx
+import os
+import pytest
+import random
+
+LARKFILE = os.path.join(os.path.dirname(__file__), '..', 'trident', 'rql.lark')
+
+def link(u, v):
+    return '(source = "%s" AND target = "%s") OR (source = "%s" AND target = "%s")' % (u, v, v, u)
+
+def best(g, sources, target):
+    return min(nx.dijkstra_path_length(g, s, target, weight='lat') for s in sources)
+
+@pytest.mark.parametrize('kind', ['DistanceTable', 'SourceTrees'])
+def test_oracle_follows_sets(tmp_path, monkeypatch, kind):
+    # Lower weights are patched in and higher ones rebuild the table, or
+    # drop the trees they can change. Either way the answers must stay those
+    # of a fresh search.
+    if kind == 'SourceTrees':
+        monkeypatch.setattr('trident.rql.graph.build_oracle',
+                            lambda *args: oracle.build_oracle(*args, max_nodes=0))
+    g = nx.connected_watts_strogatz_graph(30, 4, 0.3, seed=4)
+    g = nx.relabel_nodes(g, {n: 'n%d' % n for n in g})
+    nx.write_graphml(g, str(tmp_path / 'T.graphml'))
+    compiler = RqlCompiler(LARKFILE)
+    session = RqlSession(str(tmp_path), cache=None, oracles=['lat'])
+    run = lambda q: [r for _, r in session.execute(compiler.compile(q))]
+    run('LOAD T AS t; DEFINE COST lat, int, 5, add FOR EACH LINK IN t')
+    for u, v in g.edges():
+        g[u][v]['lat'] = 5
+
+    rng = random.Random(4)
+    nodes = sorted(g)
+    edges = sorted(g.edges())
+    for _ in range(30):
+        u, v = rng.choice(edges)
+        g[u][v]['lat'] = rng.randint(1, 9)
+        run('SET COST lat, %d FOR EACH LINK IN t THAT %s' % (g[u][v]['lat'], link(u, v)))
+        for _ in range(3):
+            sources = rng.sample(nodes, rng.randint(1, 3))
+            target = rng.choice(nodes)
+            where = '(%s) AND b::id = "%s"' % (' OR '.join('a::id = "%s"' % s for s in sources), target)
+            path, = run('OPT lat WHEN SELECT a :-: b IN t WHERE %s' % (where))
+            assert path[0] in sources and path[-1] == target
+            assert nx.path_weight(g, path, 'lat') == best(g, sources, target)
+        assert type(session.variables['t'].oracles['lat']).__name__ == kind
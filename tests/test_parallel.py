@@ -0,0 +1,59 @@
+from trident.rql.compiler import RqlCompiler
+from trident.rql.session import RqlSession
+
+import networkx as nx
+import os
+import random
+
+LARKFILE = os.path.join(os.path.dirname(__file__), '..', 'trident', 'rql.lark')
+
+def topology(tmp_path, seed):
+    # A connected topology with a random latency on every link.
+    g = nx.connected_watts_strogatz_graph(40, 4, 0.3, seed=seed)
+    g = nx.relabel_nodes(g, {n: 'n%d' % n for n in g})
+    nx.write_graphml(g, str(tmp_path / 'T.graphml'))
+    rng = random.Random(seed)
+    for u, v in g.edges():
+        g[u][v]['lat'] = rng.randint(1, 20)
+    return g
+
+def script(g):
+    lines = ['LOAD T AS t', 'DEFINE COST lat, int, 1, add FOR EACH LINK IN t']
+    for u, v, w in g.edges(data='lat'):
+        lines += ['SET COST lat, %d FOR EACH LINK IN t THAT (source = "%s" AND target = "%s") OR '
+                  '(source = "%s" AND target = "%s")' % (w, u, v, v, u)]
+    return '\n'.join(lines)
+
+def cost(g, path):
+    return sum(g[u][v]['lat'] for u, v in zip(path[:-1], path[1:]))
+
+def best(g, waypoints):
+    # The cost of the best route through one node of every waypoint.
+    dist = {n: 0 for n in waypoints[0]}
+    for targets in waypoints[1:]:
+        dist = {t: min(d + nx.dijkstra_path_length(g, s, t, weight='lat') for s, d in dist.items())
+                for t in targets}
+    return min(dist.values())
+
+def test_parallel_searches_match_serial(tmp_path):
+    g = topology(tmp_path, 3)
+    compiler = RqlCompiler(LARKFILE)
+    serial = RqlSession(str(tmp_path), cache=None, engine='networkx')
+    parallel = RqlSession(str(tmp_path), cache=None, workers=2)
+    try:
+        for session in [serial, parallel]:
+            list(session.execute(compiler.compile(script(g))))
+        rng = random.Random(3)
+        nodes = sorted(g)
+        for _ in range(5):
+            waypoints = [rng.sample(nodes, 3), rng.sample(nodes, 2), rng.sample(nodes, 3)]
+            where = ' AND '.join('(%s)' % ' OR '.join('%s::id = "%s"' % (wp, n) for n in ns)
+                                 for wp, ns in zip(['a', 'w', 'b'], waypoints))
+            query = 'OPT lat WHEN SELECT a :-: w :-: b IN t WHERE %s' % (where)
+            for session in [serial, parallel]:
+                (_, path), = session.execute(compiler.compile(query))
+                assert path[0] in waypoints[0] and path[-1] in waypoints[2]
+                assert any(n in waypoints[1] for n in path)
+                assert cost(g, path) == best(g, waypoints)
+    finally:
+        parallel.executor.shutdown()
@@ -0,0 +1,73 @@
+from trident.rql.compiler import RqlCompiler
+from trident.rql.session import RqlSession
+
+import networkx as nx
+import operator
+import os
+import random
+
+LARKFILE = os.path.join(os.path.dirname(__file__), '..', 'trident', 'rql.lark')
+
+OPS = {'=': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le,
+       '>': operator.gt, '>=': operator.ge}
+
+def test_lookups_match_scans(tmp_path):
+    # `t` scans the cap column, `u` looks it up in a hash and a sorted index
+    # that SETs keep up to date. Both must select what the values say.
+    g = nx.gnm_random_graph(30, 60, seed=5)
+    g = nx.relabel_nodes(g, {n: 'n%d' % n for n in g})
+    nx.write_graphml(g, str(tmp_path / 'T.graphml'))
+    compiler = RqlCompiler(LARKFILE)
+    session = RqlSession(str(tmp_path), cache=None)
+    run = lambda q: [r for _, r in session.execute(compiler.compile(q))]
+    for var in ['t', 'u']:
+        run('LOAD T AS %s; DEFINE PROPERTY cap, int, 5 FOR EACH LINK IN %s' % (var, var))
+    session.variables['u'].create_index('LINK', 'cap', 'hash')
+    session.variables['u'].create_index('LINK', 'cap', 'sorted')
+
+    rng = random.Random(5)
+    links = len(g.edges())
+    caps = [5] * links
+    def constraint():
+        op = rng.choice(list(OPS))
+        value = rng.randint(0, 10)
+        return '(cap %s %d)' % (op, value), lambda e: OPS[op](caps[e], value)
+
+    for _ in range(30):
+        # Some links at a time, then all of them now and then.
+        first, last = sorted(rng.sample(range(links), 2))
+        value = rng.randint(0, 10)
+        if rng.random() < 0.1:
+            first, last = 0, links - 1
+        for var in ['t', 'u']:
+            run('SET PROPERTY cap, %d FOR EACH LINK IN %s THAT id >= %d AND id <= %d'
+                % (value, var, first, last))
+        for e in range(first, last + 1):
+            caps[e] = value
+
+        for _ in range(5):
+            (lhs, lhs_test), (rhs, rhs_test) = constraint(), constraint()
+            andor = rng.choice(['AND', 'OR'])
+            where = '%s %s %s' % (lhs, andor, rhs)
+            if andor == 'AND':
+                expected = [e for e in range(links) if lhs_test(e) and rhs_test(e)]
+            else:
+                expected = [e for e in range(links) if lhs_test(e) or rhs_test(e)]
+            cmd = compiler.compile('SET PROPERTY cap, 0 FOR EACH LINK IN t THAT %s' % (where))[0]
+            for var in ['t', 'u']:
+                found = session.variables[var].select_element('LINK', cmd.selection.constraints)
+                assert sorted(found) == expected
+
+def test_id_lookups(tmp_path):
+    g = nx.path_graph(['n0', 'n1', 'n2', 'n3'])
+    nx.write_graphml(g, str(tmp_path / 'T.graphml'))
+    compiler = RqlCompiler(LARKFILE)
+    session = RqlSession(str(tmp_path), cache=None)
+    list(session.execute(compiler.compile('LOAD T AS t')))
+    t = session.variables['t']
+    select = lambda where: sorted(t.select_element('NODE', compiler.compile(
+        'SET PROPERTY x, 0 FOR EACH NODE IN t THAT %s' % (where))[0].selection.constraints))
+    assert select('id = "n2"') == ['n2']
+    assert select('id = "n9"') == []
+    assert select('id = "n1" OR id = "n3"') == ['n1', 'n3']
+    assert select('id != "n1"') == ['n0', 'n2', 'n3']
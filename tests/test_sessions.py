@@ -0,0 +1,57 @@
+from trident.demo import TridentDemo
+from trident.rql.compiler import RqlCompiler
+from trident.sessions import SessionManager
+
+import networkx as nx
+import os
+
+LARKFILE = os.path.join(os.path.dirname(__file__), '..', 'trident', 'rql.lark')
+
+class Closing():
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+def test_clients_are_isolated(tmp_path):
+    g = nx.path_graph(['n0', 'n1', 'n2'])
+    nx.write_graphml(g, str(tmp_path / 'T.graphml'))
+    compiler = RqlCompiler(LARKFILE)
+    sessions = SessionManager(lambda: TridentDemo(str(tmp_path), compiler))
+    a, alice = sessions.get()
+    b, bob = sessions.get()
+    assert a != b and alice is not bob
+    assert sessions.get(a) == (a, alice)
+
+    for demo in [alice, bob]:
+        demo.query('LOAD T AS t; DEFINE PROPERTY cap, int, 1 FOR EACH LINK IN t')
+    alice.query('SET PROPERTY cap, 5 FOR EACH LINK IN t')
+    assert 'u' not in bob.session.variables
+    alice.query('LOAD T AS u')
+    assert 'u' in alice.session.variables and 'u' not in bob.session.variables
+
+    t, u = alice.session.variables['t'], bob.session.variables['t']
+    assert [t.edge_table.get(e, 'cap') for e in range(2)] == [5, 5]
+    assert [u.edge_table.get(e, 'cap') for e in range(2)] == [1, 1]
+    # Both sessions fork the cached topology, and share the columns that
+    # neither of them wrote to.
+    assert t.node_table.columns['id'] is u.node_table.columns['id']
+
+def test_expiry_and_capacity(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr('time.monotonic', lambda: now[0])
+    sessions = SessionManager(Closing, timeout=10, capacity=2)
+    a, first = sessions.get()
+    b, second = sessions.get()
+    now[0] = 5
+    sessions.get(a)
+    c, third = sessions.get()
+    # The least recently used one goes beyond the capacity.
+    assert second.closed and not first.closed
+    assert sessions.get(b)[1] is not second
+
+    now[0] = 100
+    token, fresh = sessions.get(a)
+    assert first.closed and third.closed
+    assert token != a and len(sessions) == 1
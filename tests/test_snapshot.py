@@ -0,0 +1,37 @@
+from trident.rql.compiler import RqlCompiler
+from trident.rql.session import RqlSession
+from trident.rql.snapshot import read_snapshot, snapshot_path, write_snapshot
+
+import networkx as nx
+import os
+
+LARKFILE = os.path.join(os.path.dirname(__file__), '..', 'trident', 'rql.lark')
+
+def test_port_annotations_round_trip(tmp_path):
+    g = nx.Graph()
+    g.add_edges_from([('a', 'b'), ('b', 'c')])
+    filename = str(tmp_path / 'T.graphml')
+    nx.write_graphml(g, filename)
+
+    compiler = RqlCompiler(LARKFILE)
+    session = RqlSession(str(tmp_path), cache=None)
+    run = lambda q: [r for _, r in session.execute(compiler.compile(q))]
+    run('LOAD T AS t')
+    run('DEFINE PROPERTY pp, int, 1 FOR EACH PORT IN t')
+    run('SET PROPERTY pp, 7 FOR EACH PORT IN t')
+    run('DEFINE COST lat, int, 3, add FOR EACH LINK IN t')
+    write_snapshot(session.variables['t'], snapshot_path(filename))
+
+    gdb = read_snapshot(snapshot_path(filename))
+    ports = sorted(session.variables['t'].ports)
+    assert sorted(gdb.ports) == ports
+    assert [gdb.ports[p]['pp'] for p in ports] == [7] * 4
+    assert 'pp' in gdb.port_prop_specs
+    assert list(gdb.cost_specs) == ['lat']
+    assert set(vars(gdb)) == set(vars(session.variables['t']))
+
+    # The snapshot is fresh, so LOAD reads it.
+    run('LOAD T AS u')
+    run('SET PROPERTY pp, 5 FOR EACH PORT IN u')
+    u = session.variables['u']
+    assert [u.ports[p]['pp'] for p in ports] == [5] * 4
@@ -0,0 +1,106 @@
+from trident.rql.compiler import RqlCompiler
+from trident.rql.graph import GraphDB
+from trident.rql.session import RqlSession
+
+import networkx as nx
+import os
+import random
+
+LARKFILE = os.path.join(os.path.dirname(__file__), '..', 'trident', 'rql.lark')
+
+def link(u, v):
+    return '(source = "%s" AND target = "%s") OR (source = "%s" AND target = "%s")' % (u, v, v, u)
+
+def cost(g, path):
+    return sum(g[u][v]['lat'] for u, v in zip(path[:-1], path[1:]))
+
+def best(g, waypoints):
+    dist = {n: 0 for n in waypoints[0]}
+    for targets in waypoints[1:]:
+        dist = {t: min(d + nx.dijkstra_path_length(g, s, t, weight='lat') for s, d in dist.items())
+                for t in targets}
+    return min(dist.values())
+
+def run_watches(tmp_path, engine, seed):
+    # Random SETs on a topology with standing WATCHes, whose paths must stay
+    # as good as searching again.
+    g = nx.connected_watts_strogatz_graph(30, 4, 0.3, seed=seed)
+    g = nx.relabel_nodes(g, {n: 'n%d' % n for n in g})
+    nx.write_graphml(g, str(tmp_path / 'T.graphml'))
+    compiler = RqlCompiler(LARKFILE)
+    session = RqlSession(str(tmp_path), cache=None, engine=engine)
+    run = lambda q: [r for _, r in session.execute(compiler.compile(q))]
+    run('LOAD T AS t; DEFINE COST lat, int, 5, add FOR EACH LINK IN t')
+    for u, v in g.edges():
+        g[u][v]['lat'] = 5
+
+    rng = random.Random(seed)
+    nodes = sorted(g)
+    watches = {
+        'w1': [[nodes[0]], [nodes[1]]],
+        'w2': [rng.sample(nodes, 3), rng.sample(nodes, 2)],
+        'w3': [[nodes[2]], [nodes[3]], [nodes[4]]],
+    }
+    for name, waypoints in watches.items():
+        wps = ['a', 'b'] if len(waypoints) == 2 else ['a', 'w', 'b']
+        where = ' AND '.join('(%s)' % ' OR '.join('%s::id = "%s"' % (wp, n) for n in ns)
+                             for wp, ns in zip(wps, waypoints))
+        run('OPT lat WHEN WATCH %s IN t WHERE %s AS %s' % (' :-: '.join(wps), where, name))
+
+    edges = sorted(g.edges())
+    for _ in range(40):
+        if rng.random() < 0.2:
+            # Several links at once
+            limit, value = rng.randint(1, 9), rng.randint(1, 9)
+            run('SET COST lat, %d FOR EACH LINK IN t THAT lat > %d' % (value, limit))
+            for u, v in edges:
+                if g[u][v]['lat'] > limit:
+                    g[u][v]['lat'] = value
+        else:
+            u, v = rng.choice(edges)
+            value = rng.randint(1, 9)
+            run('SET COST lat, %d FOR EACH LINK IN t THAT %s' % (value, link(u, v)))
+            g[u][v]['lat'] = value
+        for name, waypoints in watches.items():
+            path = session.variables[name]
+            assert path[0] in waypoints[0] and path[-1] in waypoints[-1]
+            assert cost(g, path) == best(g, waypoints)
+
+def test_watches_networkx(tmp_path):
+    run_watches(tmp_path, 'networkx', 1)
+
+def test_watches_csr(tmp_path):
+    run_watches(tmp_path, 'csr', 2)
+
+def watched(tmp_path):
+    # a - b - c, and a - d - c for a longer detour
+    g = nx.Graph([('a', 'b'), ('b', 'c'), ('a', 'd'), ('d', 'c')])
+    nx.write_graphml(g, str(tmp_path / 'T.graphml'))
+    compiler = RqlCompiler(LARKFILE)
+    session = RqlSession(str(tmp_path), cache=None)
+    run = lambda q: [r for _, r in session.execute(compiler.compile(q))]
+    run('LOAD T AS t; DEFINE COST lat, int, 5, add FOR EACH LINK IN t')
+    run('SET COST lat, 1 FOR EACH LINK IN t THAT %s' % (link('a', 'b')))
+    run('OPT lat WHEN WATCH x :-: y IN t WHERE x::id = "a" AND y::id = "c" AS w')
+    return session, run
+
+def test_failed_refresh(tmp_path, monkeypatch):
+    session, run = watched(tmp_path)
+    assert session.variables['w'] == ['a', 'b', 'c']
+    def fail(self, search, waypoints):
+        raise Exception('search failed')
+    with monkeypatch.context() as m:
+        m.setattr(GraphDB, 'find_route', fail)
+        run('SET COST lat, 0 FOR EACH LINK IN t THAT %s' % (link('a', 'd')))
+    assert session.variables['w'] == []
+    # Any later SET brings the watch back, even one that cannot change the path.
+    run('SET COST lat, 9 FOR EACH LINK IN t THAT %s' % (link('d', 'c')))
+    assert session.variables['w'] == ['a', 'b', 'c']
+
+def test_earlier_versions(tmp_path):
+    session, run = watched(tmp_path)
+    before = session.variables['t']
+    run('SET COST lat, 20 FOR EACH LINK IN t THAT %s' % (link('b', 'c')))
+    assert session.variables['w'] == ['a', 'd', 'c']
+    assert session.variables['t'].watches[0].path == ['a', 'd', 'c']
+    assert before.watches[0].path == ['a', 'b', 'c']
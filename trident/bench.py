@@ -0,0 +1,276 @@
+from trident.rql.cache import TopologyCache
+from trident.rql.compiler import RqlCompiler
+from trident.rql.layout import layout_cache
+from trident.rql.session import RqlSession
+
+from contextlib import redirect_stdout
+
+import argparse
+import gc
+import glob
+import io
+import json
+import math
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import networkx as nx
+import numpy as np
+
+# The scripts of trident/example.rql and trident/example2.rql, with the
+# waypoints and links picked from the benchmarked topology.
+EXAMPLE = '''
+LOAD {name} AS {name};
+SHOW {name}
+'''
+
+EXAMPLE2 = '''
+LOAD {name} AS topology
+DEFINE COST hopcount, int, 1, add FOR EACH LINK IN topology
+DEFINE PROPERTY capacity, int, 10000000 FOR EACH LINK IN topology
+SET COST hopcount, 2
+FOR EACH LINK IN topology THAT source = "{a}" AND target = "{b}"
+OPT hopcount WHEN
+SELECT src :-: dst IN topology
+WHERE (src::id = "{s1}" OR src::id = "{s2}") AND dst::id = "{t}"
+AS view
+OPT hopcount WHEN
+WATCH src :-: firewall :<: dst IN topology
+WHERE src::id = "{s1}" AND firewall::id = "{s2}" AND dst::id = "{t}"
+SELECT src :-: dst IN topology WHERE src::id = "{s1}" AND dst::id = "{u}" AS view
+SELECT src :-: dst IN topology WHERE src::id = "{s1}" AND dst::id = "{u}" AND capacity > 10 AS view
+SHOW view
+'''
+
+LINKS = 'SET PROPERTY capacity, 10 FOR EACH LINK IN topology THAT source = "{a}" AND target = "{b}"'
+NODES = 'SET PROPERTY capacity, 10 FOR EACH NODE IN topology THAT id = "{s1}" OR id = "{t}"'
+PATH = 'OPT hopcount WHEN SELECT src :-: dst IN topology WHERE src::id = "{s}" AND dst::id = "{t}"'
+
+def synthetic(n, seed, degree=4):
+    # A random geometric graph with `n` nodes of about `degree` links each,
+    # placed on the globe so that layouts come from the coordinates, as
+    # for most of the Topology Zoo.
+    radius = math.sqrt(degree / (math.pi * n))
+    g = nx.random_geometric_graph(n, radius, seed=seed)
+    h = nx.Graph()
+    for i, (x, y) in nx.get_node_attributes(g, 'pos').items():
+        h.add_node('n%d' % i, label='n%d' % i, Longitude=360 * x - 180, Latitude=180 * y - 90)
+    h.add_edges_from(('n%d' % u, 'n%d' % v) for u, v in g.edges())
+    return h
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(math.ceil(q / 100.0 * len(ordered))) - 1)]
+
+def summarize(samples, peak):
+    total = sum(samples)
+    return {
+        'runs': len(samples),
+        'mean_ms': 1e3 * total / len(samples),
+        'p50_ms': 1e3 * percentile(samples, 50),
+        'p90_ms': 1e3 * percentile(samples, 90),
+        'p99_ms': 1e3 * percentile(samples, 99),
+        'max_ms': 1e3 * max(samples),
+        'throughput': len(samples) / total if total > 0 else None,
+        'peak_kb': peak / 1024.0
+    }
+
+class Bench():
+    # Runs every stage on one topology at a time. A stage runs `runs` times,
+    # or as many as fit in `budget` seconds but at least once, after a run
+    # to warm up. The peak memory is that of one more run, traced apart
+    # since tracing slows the others down.
+    def __init__(self, compiler, runs=20, budget=5.0, seed=1):
+        self.compiler = compiler
+        self.runs = runs
+        self.budget = budget
+        self.seed = seed
+
+    def measure(self, step, warmup=True):
+        # `step` gets the run number.
+        with redirect_stdout(io.StringIO()):
+            if warmup:
+                step(0)
+            gc.collect()
+            samples = []
+            started = time.perf_counter()
+            while len(samples) < self.runs and (len(samples) == 0 or
+                                                time.perf_counter() - started < self.budget):
+                t0 = time.perf_counter()
+                step(len(samples))
+                samples += [time.perf_counter() - t0]
+            tracemalloc.start()
+            try:
+                step(len(samples))
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        return summarize(samples, peak)
+
+    def waypoints(self, gdb):
+        # Nodes and a link of the largest component, so that every path
+        # query of the scripts has an answer.
+        rng = random.Random(self.seed)
+        component = max(nx.connected_components(gdb.raw_graph), key=len)
+        nodes = sorted(component, key=str)
+        ids = gdb.node_table.ids
+        e = next(e for e in range(len(gdb.edge_table)) if ids[gdb.sources[e]] in component)
+        a, b = ids[gdb.sources[e]], ids[gdb.targets[e]]
+        s1, s2, t, u = [rng.choice(nodes) for _ in range(4)]
+        pairs = [(rng.choice(nodes), rng.choice(nodes)) for _ in range(max(self.runs, 1) + 2)]
+        return {'a': a, 'b': b, 's1': s1, 's2': s2, 't': t, 'u': u}, pairs
+
+    def run(self, topo_dir, name):
+        compiler = self.compiler
+        stages = {}
+        cache = TopologyCache()
+
+        def session(cache=cache):
+            return RqlSession(topo_dir, cache=cache, results=None)
+
+        def execute(s, script):
+            return [r for _, r in s.execute(compiler.compile(script))]
+
+        probe = session()
+        with redirect_stdout(io.StringIO()):
+            execute(probe, 'LOAD %s AS topology' % (name))
+        gdb = probe.variables['topology']
+        layout_cache.wait(gdb.raw_graph)
+        marks, pairs = self.waypoints(gdb)
+        marks['name'] = name
+        script = EXAMPLE2.format(**marks)
+
+        def parse(k):
+            compiler.programs.clear()
+            compiler.compile(script)
+        stages['compile'] = self.measure(parse)
+        stages['compile_cached'] = self.measure(lambda k: compiler.compile(script))
+        stages['load_cold'] = self.measure(lambda k: execute(session(None), 'LOAD %s AS t' % (name)),
+                                           warmup=False)
+        stages['load'] = self.measure(lambda k: execute(session(), 'LOAD %s AS t' % (name)))
+        stages['example'] = self.measure(lambda k: execute(session(), EXAMPLE.format(**marks)))
+        stages['example2'] = self.measure(lambda k: execute(session(), script))
+
+        with redirect_stdout(io.StringIO()):
+            execute(probe, script)
+        gdb = probe.variables['topology']
+        links = compiler.compile(LINKS.format(**marks))[0].selection.constraints
+        nodes = compiler.compile(NODES.format(**marks))[0].selection.constraints
+        stages['select_element_link'] = self.measure(lambda k: gdb.select_element('LINK', links))
+        stages['select_element_node'] = self.measure(lambda k: gdb.select_element('NODE', nodes))
+        paths = [compiler.compile(PATH.format(s=s, t=t))[0] for s, t in pairs]
+        stages['select_path'] = self.measure(
+            lambda k: gdb.select_path(paths[k].ra_expr, paths[k].constraints, paths[k].opt_obj))
+        stages['data'] = self.measure(lambda k: gdb.data())
+        return {
+            'nodes': len(gdb.node_table),
+            'links': len(gdb.edge_table),
+            'engine': gdb.engine,
+            'stages': stages
+        }
+
+def compare(results, baseline, tolerance=0.25, floor=0.05):
+    # The stages whose median got slower than the baseline by more than
+    # `tolerance`, ignoring differences below `floor` milliseconds.
+    regressions = []
+    for name, topo in sorted(results['topologies'].items()):
+        base = baseline.get('topologies', {}).get(name, None)
+        if base is None:
+            continue
+        for stage, stats in sorted(topo['stages'].items()):
+            old = base['stages'].get(stage, None)
+            if old is None:
+                continue
+            new_ms, old_ms = stats['p50_ms'], old['p50_ms']
+            if new_ms > old_ms * (1 + tolerance) and new_ms - old_ms > floor:
+                regressions += [{'topology': name, 'stage': stage, 'p50_ms': new_ms,
+                                 'baseline_p50_ms': old_ms, 'ratio': new_ms / old_ms}]
+    return regressions
+
+def environment():
+    try:
+        import scipy
+        scipy_version = scipy.__version__
+    except ImportError:
+        scipy_version = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'networkx': nx.__version__,
+        'numpy': np.__version__,
+        'scipy': scipy_version
+    }
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='python3 -m trident.bench',
+                                     description='Benchmarks the stages of RQL scripts.')
+    parser.add_argument('topo_dir', nargs='?', default='dataset/sources',
+                        help='directory of GraphML topologies (default: dataset/sources)')
+    parser.add_argument('--larkfile', default=os.path.join(os.path.dirname(__file__), 'rql.lark'))
+    parser.add_argument('--only', default=None, help='comma separated topology names')
+    parser.add_argument('--synthetic', default='1000,10000,100000',
+                        help='comma separated node counts of synthetic topologies, or ""')
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--budget', type=float, default=5.0, help='seconds per stage')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default=None, help='file for the JSON results')
+    parser.add_argument('--baseline', default=None, help='JSON results to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    names = [os.path.basename(f)[:-len('.graphml')]
+             for f in sorted(glob.glob('%s/*.graphml' % args.topo_dir))]
+    if args.only is not None:
+        names = [n for n in names if n in args.only.split(',')]
+    bench = Bench(RqlCompiler(args.larkfile), args.runs, args.budget, args.seed)
+    results = {'environment': environment(), 'runs': args.runs, 'budget': args.budget,
+               'seed': args.seed, 'topologies': {}}
+
+    def run(topo_dir, name):
+        try:
+            results['topologies'][name] = bench.run(topo_dir, name)
+            stages = results['topologies'][name]['stages']
+            print('%s: %s' % (name, ', '.join('%s %.2fms' % (s, stages[s]['p50_ms'])
+                                              for s in sorted(stages))), file=sys.stderr)
+        except Exception as e:
+            print('Failed to benchmark %s: %s' % (name, e), file=sys.stderr)
+
+    # Only the results go to stdout, including what background layouts print.
+    with redirect_stdout(sys.stderr):
+        for name in names:
+            run(args.topo_dir, name)
+        sizes = [int(n) for n in args.synthetic.split(',') if n.strip() != '']
+        if len(sizes) > 0:
+            with tempfile.TemporaryDirectory(prefix='trident-bench-') as synthetic_dir:
+                for n in sizes:
+                    name = 'Synthetic%d' % (n)
+                    nx.write_graphml(synthetic(n, args.seed), '%s/%s.graphml' % (synthetic_dir, name))
+                    run(synthetic_dir, name)
+    results['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    status = 0
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            results['regressions'] = compare(results, json.load(f), args.tolerance)
+        for r in results['regressions']:
+            print('Regression in %s %s: %.2fms, was %.2fms' % (r['topology'], r['stage'], r['p50_ms'],
+                                                              r['baseline_p50_ms']), file=sys.stderr)
+        status = 1 if len(results['regressions']) > 0 else 0
+
+    document = json.dumps(results, indent=2, sort_keys=True)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            f.write(document + '\n')
+    else:
+        print(document)
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -1,49 +1,167 @@
 
+import json
 import networkx as nx
 import re
 
-from trident.rql.common import SelectCommand, ShowCommand
+from trident.events import EventHub, merge_values
+from trident.rql import deadline
+from trident.rql.common import DefineCommand, ExplainCommand, SelectCommand, SetCommand, ShowCommand
+from trident.rql.batch import BatchContext
 from trident.rql.session import RqlSession
-from trident.rql.compiler import RqlCompiler
+
+def path_result(expr, path):
+    return {
+        'type': 'path',
+        'expr': expr,
+        'path': list(zip(path[:-1], path[1:]))
+    }
 
 class TridentDemo(object):
-    def __init__(self, topo_dir, larkfile):
-        self.session = RqlSession(topo_dir)
-        self.compiler = RqlCompiler(larkfile)
+    # The state of one client: its variables and the subscribers to its
+    # WATCH updates. The compiler and the worker pool can be shared by all
+    # the clients, and topologies are shared through the topology cache.
+    def __init__(self, topo_dir, compiler, executor=None, oracles=()):
+        self.session = RqlSession(topo_dir, oracles=oracles, executor=executor)
+        self.compiler = compiler
+        self.events = EventHub()
+
+    def close(self):
+        self.events.close()
+
+    def selected(self, cmd):
+        # The elements a SET writes to, taken before it runs since it may
+        # change the properties its own selection depends on.
+        if not isinstance(cmd, SetCommand) or len(self.events.subscribers) == 0:
+            return None
+        selection = cmd.selection
+        topo = self.session.variables.get(str(selection.toponame), None)
+        if topo is None or selection.element_type == 'PORT':
+            return None
+        try:
+            return topo.select_indices(selection.element_type, selection.constraints)
+        except Exception:
+            return None
+
+    def publish(self, cmd, result, selected=None):
+        # Pushes the changed WATCH results and property values of a SET to
+        # the clients subscribed to /events.
+        if isinstance(result, list):
+            for watch in result:
+                self.events.publish(('path', str(watch.cmd)), path_result(str(watch.cmd), watch.path or []))
+        selection = cmd.selection
+        topo = self.session.variables.get(str(selection.toponame), None)
+        if selected is not None and topo is not None:
+            varname = str(cmd.varname)
+            # The version the SET published
+            table = topo.get_table(selection.element_type)[0]
+            key = ('delta', str(selection.toponame), selection.element_type, varname)
+            self.events.publish(key, {
+                'type': 'delta',
+                'topology': str(selection.toponame),
+                'element_type': selection.element_type,
+                'property': varname,
+                'values': {str(table.ids[i]): table.get(i, varname) for i in selected}
+            }, merge_values)
 
     def query(self, query):
+        return list(self.results(query))
+
+    def results(self, query):
+        # Results are yielded as soon as they are known, including every
+        # path of a SELECT ... LIMIT.
         try:
             print(query)
             commands = self.compiler.compile(query)
         except Exception as e:
             print(e)
-            return [{'type': 'error', 'message': 'Error parsing %s' % (query)}]
+            yield {'type': 'error', 'message': 'Error parsing %s' % (query)}
+            return
 
-        retval = []
         try:
-            for cmd, result in self.session.execute(commands):
+            for cmd in commands:
+                deadline.check()
+                if isinstance(cmd, SelectCommand) and cmd.limit is not None and not cmd.reactive:
+                    for path in self.session.stream(cmd):
+                        yield path_result(str(cmd), path)
+                    continue
+                if isinstance(cmd, ExplainCommand):
+                    for result in self.explained(cmd):
+                        yield result
+                    continue
+                selected = self.selected(cmd)
+                result = self.session.dispatch(cmd)
                 print('cmd = ', cmd)
                 print('result = ', result)
                 if isinstance(cmd, SelectCommand):
                     if isinstance(result, list):
-                        retval += [{
-                            'type': 'path',
-                            'expr': str(cmd),
-                            'path': list(zip(result[:-1], result[1:]))
-                        }]
+                        yield path_result(str(cmd), result)
+                elif isinstance(cmd, (SetCommand, DefineCommand)):
+                    self.publish(cmd, result, selected)
+                    # Watches whose path changed
+                    if isinstance(result, list):
+                        for watch in result:
+                            yield path_result(str(watch.cmd), watch.path or [])
                 elif isinstance(cmd, ShowCommand):
                     if isinstance(result, list):
-                        retval += [{
-                            'type': 'path',
-                            'expr': str(cmd),
-                            'path': list(zip(result[:-1], result[1:]))
-                        }]
+                        # The paths of a SELECT ... LIMIT, or a single one
+                        paths = result if len(result) > 0 and isinstance(result[0], list) else [result]
+                        for path in paths:
+                            yield path_result(str(cmd), path)
                     else:
-                        retval += [{
+                        yield {
                             'type': 'topology',
                             'expr': str(cmd),
+                            'name': str(cmd.var_ref),
                             'topology': result.data()
-                        }]
+                        }
         except Exception as e:
-            retval += [{'type': 'error', 'expr': str(cmd), 'message': e.message}]
-        return retval
+            yield {'type': 'error', 'expr': str(cmd), 'message': str(e)}
+
+    def explained(self, cmd):
+        # The plan or the profile of a command, followed by the paths that
+        # the command yields when PROFILE runs it.
+        inner = cmd.cmd
+        selected = self.selected(inner) if cmd.profile else None
+        result = self.session.dispatch(cmd)
+        retval = result.pop('result', None)
+        yield dict(result, type='profile' if cmd.profile else 'plan', expr=str(cmd))
+        if not cmd.profile:
+            return
+        if isinstance(inner, SelectCommand):
+            path = result.get('path', retval)
+            if isinstance(path, list) and len(path) > 0:
+                paths = path if isinstance(path[0], list) else [path]
+                for p in paths:
+                    yield path_result(str(inner), p)
+        elif isinstance(inner, (SetCommand, DefineCommand)):
+            self.publish(inner, retval, selected)
+            if isinstance(retval, list):
+                for watch in retval:
+                    yield path_result(str(watch.cmd), watch.path or [])
+
+    def batch(self, items):
+        # Every item is a script, or a parameterized SELECT with a list of
+        # parameter sets. Yields the results of every item, in order; those
+        # of a parameterized SELECT hold one result per parameter set.
+        context = BatchContext(self.session)
+        for item in items:
+            if not isinstance(item, dict):
+                yield list(self.results(str(item)))
+                continue
+            try:
+                commands = self.compiler.compile(item['select'])
+                if len(commands) != 1:
+                    raise Exception('Expected one SELECT in %s' % (item['select']))
+                cmd = commands[0]
+                results = []
+                for params, path in zip(item['params'], context.select(cmd, item['params'])):
+                    expr = '%s %s' % (cmd, json.dumps(params, sort_keys=True))
+                    if isinstance(path, Exception):
+                        results += [{'type': 'error', 'expr': expr, 'message': str(path)}]
+                    elif cmd.limit is not None:
+                        results += [[path_result(expr, p) for p in path]]
+                    else:
+                        results += [path_result(expr, path)]
+            except Exception as e:
+                results = [{'type': 'error', 'expr': str(item.get('select', None)), 'message': str(e)}]
+            yield results
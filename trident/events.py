@@ -0,0 +1,94 @@
+from collections import OrderedDict
+from threading import Condition, Lock
+
+import json
+
+def merge_values(old, new):
+    values = dict(old['values'])
+    values.update(new['values'])
+    return dict(new, values=values)
+
+class Subscription():
+    # The events waiting for one client. Events with the same key coalesce,
+    # so a slow client only gets the latest state of every watch. When more
+    # than `capacity` keys are waiting, the oldest ones are dropped and the
+    # client is told to resync.
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.pending = OrderedDict()
+        self.dropped = False
+        self.closed = False
+        self.cond = Condition()
+
+    def push(self, key, event, merge=None):
+        with self.cond:
+            if key in self.pending and merge is not None:
+                event = merge(self.pending[key], event)
+            self.pending[key] = event
+            self.pending.move_to_end(key)
+            while len(self.pending) > self.capacity:
+                self.pending.popitem(last=False)
+                self.dropped = True
+            self.cond.notify()
+
+    def wait(self, timeout=None):
+        with self.cond:
+            if len(self.pending) == 0 and not self.closed:
+                self.cond.wait(timeout)
+            events = list(self.pending.values())
+            self.pending.clear()
+            if self.dropped:
+                events = [{'type': 'resync'}] + events
+                self.dropped = False
+            return events
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+
+class EventHub():
+    # Fans out events to the subscribed clients. Publishing costs nothing
+    # without subscribers, and idle subscribers just wait on their condition.
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.subscribers = set()
+        self.lock = Lock()
+
+    def subscribe(self):
+        subscription = Subscription(self.capacity)
+        with self.lock:
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+        subscription.close()
+
+    def close(self):
+        with self.lock:
+            subscribers = list(self.subscribers)
+            self.subscribers.clear()
+        for subscription in subscribers:
+            subscription.close()
+
+    def publish(self, key, event, merge=None):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscription in subscribers:
+            subscription.push(key, event, merge)
+
+    def stream(self, subscription, heartbeat=15):
+        # Server-sent events. The heartbeat comment lets the server notice
+        # clients that went away.
+        try:
+            yield 'retry: 3000\n\n'
+            while not subscription.closed:
+                events = subscription.wait(heartbeat)
+                if len(events) == 0:
+                    yield ': ping\n\n'
+                for event in events:
+                    yield 'event: %s\ndata: %s\n\n' % (event['type'], json.dumps(event))
+        finally:
+            self.unsubscribe(subscription)
@@ -0,0 +1,111 @@
+from trident.rql import deadline
+from trident.rql.common import BasicConstraint, CompoundConstraint, SelectCommand, Value
+from trident.rql.paths import INF
+from trident.rql.session import select_key
+
+from copy import copy
+
+def to_value(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return Value('string', str(value))
+    if isinstance(value, int):
+        return Value('int', value)
+    return Value('float', value)
+
+def bind_operand(operand, params):
+    if isinstance(operand, Value) and operand.vtype == 'param':
+        if operand.value not in params:
+            raise Exception('Missing parameter $%s' % (operand.value))
+        return to_value(params[operand.value])
+    return operand
+
+def bind(constraints, params):
+    # A copy of the constraints with the placeholders replaced by `params`.
+    if constraints is None:
+        return None
+    if isinstance(constraints, BasicConstraint):
+        return BasicConstraint(bind_operand(constraints.lhs, params), constraints.op,
+                               bind_operand(constraints.rhs, params))
+    return CompoundConstraint(bind(constraints.lhs, params), constraints.op,
+                              bind(constraints.rhs, params))
+
+class BatchContext():
+    # What the SELECTs of one batch share: a path search per topology
+    # version, COST and filter, and a single search from every source
+    # waypoint to all the targets that the batch asks for from it.
+    def __init__(self, session):
+        self.session = session
+        self.searches = {}
+
+    def search(self, topo, nc, ec, opt_obj):
+        key = (topo.version, topo.engine, str(nc), str(ec), str(opt_obj))
+        search = self.searches.get(key, None)
+        if search is None:
+            node_mask, edge_mask = topo.filter_masks(nc, ec)
+            search = topo.path_search(node_mask, edge_mask, opt_obj, self.session.executor, bulk=True)
+            self.searches[key] = search
+        return search
+
+    def select(self, cmd, bindings):
+        # Runs the SELECT `cmd` once per set of parameters, and returns the
+        # path, or the exception, of each run in order.
+        if not isinstance(cmd, SelectCommand) or cmd.reactive:
+            raise Exception('Only SELECT can be parameterized: %s' % (cmd))
+        session = self.session
+        topo = session.topology(cmd)
+        ra_expr = cmd.ra_expr
+        results = [None] * len(bindings)
+        keys = [None] * len(bindings)
+        groups = {}
+        for k, params in enumerate(bindings):
+            deadline.check()
+            try:
+                bound = copy(cmd)
+                bound.constraints = bind(cmd.constraints, params)
+                if cmd.limit is not None:
+                    results[k] = list(session.select_paths(topo, bound))
+                    continue
+                if session.results is not None:
+                    keys[k] = select_key(topo, bound)
+                    path = session.results.get(keys[k])
+                    if path is not None:
+                        results[k] = list(path)
+                        continue
+                wpc, nc, ec = topo.classify_constraints(ra_expr, bound.constraints)
+                search = self.search(topo, nc, ec, cmd.opt_obj)
+                found = topo.find_waypoints(wpc)
+                waypoints = [found[wp] for wp in ra_expr.waypoints]
+                if len(waypoints) == 2 and len(waypoints[0]) == 1:
+                    group = groups.setdefault((id(search), waypoints[0][0]), (search, []))
+                    group[1].append((k, waypoints[1]))
+                else:
+                    results[k] = topo.find_route(search, waypoints)[1]
+            except Exception as e:
+                results[k] = e
+
+        # One search per source, covering the targets of all its queries
+        by_search = {}
+        for (_, source), (search, queries) in groups.items():
+            targets = list(dict.fromkeys(t for _, ts in queries for t in ts))
+            by_search.setdefault(id(search), (search, []))[1].append((source, targets, queries))
+        for search, sources in by_search.values():
+            deadline.check()
+            segments = search.segments([([source], targets) for source, targets, _ in sources])
+            for (source, targets, queries), segment in zip(sources, segments):
+                column = {t: j for j, t in enumerate(targets)}
+                for k, ts in queries:
+                    cols = [column[t] for t in ts]
+                    if len(cols) > 0:
+                        j = cols[int(segment.costs[0, cols].argmin())]
+                    if len(cols) == 0 or segment.costs[0, j] == INF:
+                        results[k] = None
+                    else:
+                        results[k] = segment.path(0, j)
+
+        for k, path in enumerate(results):
+            if path is None:
+                results[k] = Exception('No path from %s to %s'
+                                       % (ra_expr.waypoints[0], ra_expr.waypoints[-1]))
+            elif not isinstance(path, Exception) and keys[k] is not None:
+                session.results.put(keys[k], path)
+        return results
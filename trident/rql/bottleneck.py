@@ -0,0 +1,123 @@
+from trident.rql import counters, deadline
+from trident.rql.csr import CSRSearch
+from trident.rql.paths import INF, Segment, merge_segments
+
+from scipy.sparse import csr_matrix, vstack, hstack
+from scipy.sparse.csgraph import breadth_first_order, dijkstra, minimum_spanning_tree
+
+import numpy as np
+
+def bottlenecks(tree, source):
+    # The largest weight on the tree path from `source` to every node, INF
+    # for the nodes out of reach. Every node points to its predecessor in a
+    # breadth first search, and pointers are doubled until they all reach
+    # the source.
+    n = tree.shape[0]
+    order, pred = breadth_first_order(tree, source, directed=False,
+                                      return_predecessors=True)
+    counters.count('settled', len(order))
+    up = np.arange(n)
+    value = np.full(n, INF)
+    value[source] = 0
+    nodes = order[1:]
+    up[nodes] = pred[nodes]
+    value[nodes] = np.asarray(tree[nodes, pred[nodes]]).ravel()
+    while True:
+        nxt = up[up]
+        if (nxt == up).all():
+            return value
+        value = np.maximum(value, value[up])
+        up = nxt
+
+class BottleneckSearch(CSRSearch):
+    # Paths whose COST is the smallest ('min') or the largest ('max') link
+    # weight along them, i.e. widest and minimax paths. Link weights are
+    # replaced by their rank, best first, so both become minimax searches.
+    # A minimax path between any two nodes runs along a minimum spanning
+    # tree, so costs are read off one tree per query. Among the paths with
+    # the best bottleneck, the one with the fewest hops is returned.
+    def __init__(self, csr, weights, accum_func, ids, index, node_mask=None, edge_mask=None):
+        self.sign = -1.0 if accum_func == 'min' else 1.0
+        self.levels, ranks = np.unique(self.sign * weights, return_inverse=True)
+        matrix = csr.matrix((ranks + 1).astype(np.float64), edge_mask)
+        CSRSearch.__init__(self, matrix, ids, index, node_mask)
+        self.mst = None
+
+    def spanning_tree(self):
+        if self.mst is None:
+            mst = minimum_spanning_tree(self.matrix)
+            self.mst = (mst + mst.T).tocsr()
+        return self.mst
+
+    def value(self, rank):
+        if rank == INF:
+            return INF
+        if rank == 0:
+            # No link at all
+            return -self.sign * INF
+        return self.sign * float(self.levels[int(rank) - 1])
+
+    def reach(self, sources):
+        # The best bottleneck from any of the sources to every node. The
+        # sources hang off a virtual node with links better than any other,
+        # which only the tree links have to compete with. The sources
+        # themselves are reached without any link, as with a single source.
+        tree = self.spanning_tree()
+        if len(sources) == 1:
+            return bottlenecks(tree, sources[0])
+        n = tree.shape[0]
+        star = csr_matrix((np.full(len(sources), 0.5), (np.zeros(len(sources), dtype=np.int64), sources)),
+                          shape=(1, n))
+        augmented = vstack([hstack([tree, star.T]), hstack([star, csr_matrix((1, 1))])]).tocsr()
+        mst = minimum_spanning_tree(augmented)
+        reached = bottlenecks((mst + mst.T).tocsr(), n)[:n]
+        reached[sources] = 0
+        return reached
+
+    def within(self, rank, sources, targets):
+        # The path with the fewest hops over the links ranked `rank` or
+        # better, from any source to the closest target.
+        sub = self.matrix.copy()
+        sub.data[sub.data > rank] = 0
+        sub.eliminate_zeros()
+        dist, pred, _ = dijkstra(sub, unweighted=True, indices=sources, min_only=True,
+                                 return_predecessors=True)
+        counters.settled(dist)
+        k = targets[int(np.argmin(dist[targets]))]
+        return self.path(pred, k)
+
+    def best_path(self, sources, targets):
+        s, t = self.lookup(sources), self.lookup(targets)
+        if len(s) == 0 or len(t) == 0:
+            return INF, None
+        rank = self.reach(s)[t].min()
+        if rank == INF:
+            return INF, None
+        return self.value(rank), self.within(rank, s, t)
+
+    def distances(self, sources):
+        s = self.lookup(sources)
+        if len(s) == 0:
+            return np.full(self.matrix.shape[0], INF)
+        return np.array([self.value(r) for r in self.reach(s)])
+
+    def segments(self, pairs):
+        tree = self.spanning_tree()
+        segments = []
+        for sources, targets in pairs:
+            costs = np.full((len(sources), len(targets)), INF)
+            cols = np.array([j for j, n in enumerate(targets) if self.selected(n)], dtype=np.int64)
+            t = [self.index[targets[j]] for j in cols]
+            for i, n in enumerate(sources):
+                deadline.check()
+                if self.selected(n) and len(t) > 0:
+                    costs[i, cols] = bottlenecks(tree, self.index[n])[t]
+            trace = lambda i, j, sources=sources, targets=targets, costs=costs: \
+                self.within(costs[i, j], [self.index[sources[i]]], [self.index[targets[j]]])
+            segments += [Segment(sources, targets, costs, trace)]
+        return segments
+
+    def merge(self, segments):
+        # Chains segments on the (min, max) semiring of ranks.
+        rank, path = merge_segments(segments, np.maximum, 0)
+        return self.value(rank), path
@@ -0,0 +1,95 @@
+from collections import OrderedDict
+from threading import Lock
+
+import os
+
+class TopologyCache():
+    # Keeps the parsed base GraphDB of every topology file, keyed by path and
+    # invalidated by mtime. Callers always get a fork, so annotations defined
+    # on a variable never reach the cached base.
+    def __init__(self, capacity=512 * 1024 * 1024):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = Lock()
+
+    def load(self, filename, loader):
+        path = os.path.abspath(filename)
+        mtime = os.stat(path).st_mtime_ns
+
+        with self.lock:
+            entry = self.entries.get(path, None)
+            if entry is not None and entry[0] == mtime:
+                self.entries.move_to_end(path)
+                return entry[1].fork()
+
+        gdb = loader(filename)
+        footprint = gdb.footprint()
+
+        with self.lock:
+            self.discard(path)
+            if footprint <= self.capacity:
+                self.entries[path] = (mtime, gdb, footprint)
+                self.size += footprint
+                while self.size > self.capacity:
+                    _, (_, _, evicted) = self.entries.popitem(last=False)
+                    self.size -= evicted
+            # Forking marks the columns of the base as shared, which must
+            # not race with other sessions forking it.
+            return gdb.fork()
+
+    def discard(self, path):
+        entry = self.entries.pop(path, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+class ResultCache():
+    # Path results of SELECT, keyed by the version of the topology and the
+    # normalized query. Versions are never reused, so a fork shares the
+    # results of its base until either of them changes.
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            result = self.entries.get(key, None)
+            if result is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def __contains__(self, key):
+        # Unlike get(), this counts as neither a hit nor a miss.
+        with self.lock:
+            return key in self.entries
+
+    def put(self, key, result):
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+topology_cache = TopologyCache()
+result_cache = ResultCache()
@@ -1,4 +1,4 @@
-from itertools import chain
+from itertools import chain, zip_longest
 
 class LoadCommand():
     def __init__(self, toponame, varname):
@@ -94,6 +94,8 @@ class Value():
         self.value = value
 
     def __str__(self):
+        if self.vtype == 'param':
+            return '$%s' % (self.value)
         return '%s (%s)' % (self.value, self.vtype)
 
 class BasicConstraint():
@@ -123,17 +125,18 @@ class RouteAlgebraExpr():
         self.patterns = patterns
 
     def __str__(self):
-        res = list(chain(*zip(self.waypoints, self.patterns)))
-        return ' '.join(res)
+        res = list(chain(*zip_longest(self.waypoints, self.patterns, fillvalue='')))
+        return ' '.join(res).strip()
 
 class SelectCommand():
-    def __init__(self, ra_expr, toponame, varname, reactive, constraints, opt_obj):
+    def __init__(self, ra_expr, toponame, varname, reactive, constraints, opt_obj, limit=None):
         self.ra_expr = ra_expr
         self.toponame = toponame
         self.varname = varname
         self.reactive = reactive
         self.constraints = constraints
         self.opt_obj = opt_obj
+        self.limit = limit
 
     def __str__(self):
         s = ""
@@ -146,6 +149,8 @@ class SelectCommand():
         s += " %s IN %s" % (self.ra_expr, self.toponame)
         if self.constraints is not None:
             s += " WHERE %s" % self.constraints
+        if self.limit is not None:
+            s += " LIMIT %d" % self.limit
         if self.varname is not None:
             s += " AS %s" % self.varname
         return s
@@ -156,3 +161,11 @@ class DropCommand():
 
     def __str__(self):
         return 'DROP %s' % (self.var_ref)
+
+class ExplainCommand():
+    def __init__(self, cmd, profile=False):
+        self.cmd = cmd
+        self.profile = profile
+
+    def __str__(self):
+        return '%s %s' % ('PROFILE' if self.profile else 'EXPLAIN', self.cmd)
@@ -1,210 +1,223 @@
-from lark import Lark, Visitor, Tree
+from lark import Lark, Transformer, Tree, v_args
+from lark.exceptions import VisitError
 from trident.rql.common import *
 
-class RqlCompiler(Visitor):
-    def __init__(self, larkfile):
+from collections import OrderedDict
+from copy import deepcopy
+from threading import Lock
+
+def normalize(program):
+    lines = [l.rstrip() for l in program.splitlines()]
+    while len(lines) > 0 and lines[-1] == '':
+        lines.pop()
+    return '\n'.join(lines)
+
+class RqlCompiler(Transformer):
+    # Every rule returns its result instead of annotating the parse tree, and
+    # the instance only holds the parser and the program cache, so a single
+    # compiler can be shared by all request threads.
+    def __init__(self, larkfile, parser='lalr', cache=True, cache_size=256):
+        super().__init__()
+        # The LALR tables are persisted by lark (in the temp directory, or in
+        # the file given as `cache`), so only the first process builds them.
+        if parser != 'lalr':
+            cache = False
         with open(larkfile) as f:
-            self.parser = Lark(f.read(), propagate_positions=True)
-        self.commands = []
+            self.parser = Lark(f.read(), parser=parser, cache=cache,
+                               propagate_positions=True,
+                               maybe_placeholders=False)
+        self.programs = OrderedDict()
+        self.cache_size = cache_size
+        self.lock = Lock()
 
-    def start(self, ast):
-        commands = []
-        commands = list(filter(lambda c: isinstance(c, Tree), ast.children[0].children))
-        for c in commands:
-            print(c)
-            print(c.cmd)
-        self.commands = list(map(lambda c: c.cmd, commands))
+    def start(self, children):
+        return children[0]
 
-    def statements(self, ast):
-        print(ast)
+    def statements(self, children):
+        return list(children)
 
-    def statement(self, ast):
-        ast.cmd = ast.children[0].cmd
+    def statement(self, children):
+        return children[0]
 
-    def load_statement(self, ast):
-        _, toponame, _, varname = ast.children
-        ast.cmd = LoadCommand(toponame, varname.value)
+    def load_statement(self, children):
+        _, toponame, _, varname = children
+        return LoadCommand(toponame, varname.value)
 
+    @v_args(tree=True)
     def define_statement(self, ast):
         _, data_type, data_spec, selection = ast.children
-        data_spec = data_spec.spec
         if data_type != data_spec.data_type:
             raise Exception('Definition type mismatch at Line %s: %s, %s'
                             % (ast.meta.line, data_type, data_spec))
-        selection = selection.selection
         if selection.constraints is not None:
             raise Exception('DEFINE statement MUST NOT have constraints at Line %s'
                             % (ast.meta.line))
-        ast.cmd = DefineCommand(data_type, data_spec, selection)
-
-    def property_spec(self, ast):
-        varname, vartype, value = ast.children
-        varname = varname.value
-        vartype = vartype.value
-        value = value.value
-        ast.spec = DataSpec(varname, vartype, value)
-
-    def cost_spec(self, ast):
-        varname, vartype, value, accum_func = ast.children
-        varname = varname.value
-        vartype = vartype.value
-        value = value.value
-        accum_func = accum_func.value
-        ast.spec = DataSpec(varname, vartype, value, accum_func)
-
-    def element_selection(self, ast):
-        for_each = ast.children[0]
-        element_type = for_each.element_type
-        toponame = for_each.toponame
-        if len(ast.children) > 1:
-            that = ast.children[1]
-            constraints = that.constraints
+        return DefineCommand(data_type, data_spec, selection)
+
+    def property_spec(self, children):
+        varname, vartype, value = children
+        return DataSpec(varname, vartype.value, value)
+
+    def cost_spec(self, children):
+        varname, vartype, value, accum_func = children
+        return DataSpec(varname, vartype.value, value, accum_func.value)
+
+    def element_selection(self, children):
+        element_type, toponame = children[0]
+        if len(children) > 1:
+            constraints = children[1]
             # TODO: assert data_type == constraints.data_type
         else:
             constraints = None
-        ast.selection = ElementSelection(toponame, element_type, constraints)
+        return ElementSelection(toponame, element_type, constraints)
 
-    def for_each_clause(self, ast):
-        _, _, element_type, _, toponame = ast.children
-        ast.element_type = element_type.value
-        ast.toponame = toponame.value
+    def for_each_clause(self, children):
+        _, _, element_type, _, toponame = children
+        return element_type.value, toponame.value
 
-    def that_clause(self, ast):
-        _, constraints = ast.children
-        ast.constraints = constraints.constraints
+    def that_clause(self, children):
+        _, constraints = children
+        return constraints
 
-    def set_statement(self, ast):
-        if len(ast.children) == 4:
-            _, data_type, varname, selection = ast.children
+    def set_statement(self, children):
+        if len(children) == 4:
+            _, data_type, varname, selection = children
             value = None
         else:
-            _, data_type, varname, value, selection = ast.children
-        selection = selection.selection
-        ast.cmd = SetCommand(data_type, varname.value, value.value, selection)
+            _, data_type, varname, value, selection = children
+        return SetCommand(data_type, varname, value, selection)
 
-    def prop_constraint(self, ast):
-        if len(ast.children) == 1:
-            ast.constraints = ast.children[0].constraints
-        else:
-            c1, op, c2 = ast.children
-            ast.constraints = CompoundConstraint(c1.constraints, op, c2.constraints)
+    def prop_constraint(self, children):
+        if len(children) == 1:
+            return children[0]
+        c1, op, c2 = children
+        return CompoundConstraint(c1, op, c2)
 
-    def or_prop_constraint(self, ast):
-        if len(ast.children) == 1:
-            ast.constraints = ast.children[0].constraints
-        else:
-            c1, op, c2 = ast.children
-            ast.constraints = CompoundConstraint(c1.constraints, op, c2.constraints)
+    def or_prop_constraint(self, children):
+        if len(children) == 1:
+            return children[0]
+        c1, op, c2 = children
+        return CompoundConstraint(c1, op, c2)
 
-    def encap_prop_constraint(self, ast):
-        ast.constraints = ast.children[0].constraints
+    def encap_prop_constraint(self, children):
+        return children[0]
 
-    def not_prop_constraint(self, ast):
-        op, c = ast.children
-        ast.constraints = CompoundConstraint(c.constraints, op)
+    def not_prop_constraint(self, children):
+        return CompoundConstraint(children[-1], 'NOT')
 
-    def basic_prop_constraint(self, ast):
-        lhs, op, rhs = ast.children
-        ast.constraints = BasicConstraint(lhs.value, op.value, rhs.value)
+    def basic_prop_constraint(self, children):
+        lhs, op, rhs = children
+        return BasicConstraint(lhs, op.value, rhs)
 
-    def operand(self, ast):
-        ast.value = ast.children[0].value
+    def operand(self, children):
+        return children[0]
 
-    def var_ref(self, ast):
-        children = ast.children
-        if children[0].type == 'WAYPOINT':
-            waypoint = ast.children[0].value
+    def var_ref(self, children):
+        if isinstance(children[0], Tree):
+            waypoint = children[0].children[0].value
             children = children[1:]
         else:
             waypoint = None
         path = list(map(lambda c: c.value, children))
-        ast.value = VarRef(waypoint, path)
-
-    def select_statement(self, ast):
-        children = ast.children.copy()
-        if children[0].data == 'opt_clause':
-            opt_obj = children[0].opt_obj
-            children = children[1:]
-        else:
-            opt_obj = None
-
-        reactive = children[0].reactive
-        ra_expr = children[0].ra_expr
-        toponame = children[0].toponame
-        children = children[1:]
-
-        if len(children) > 0 and children[0].data == 'where_clause':
-            constraints = children[0].constraints
-            children = children[1:]
-        else:
-            constraints = None
-
-        if len(children) > 0 and children[0].data == 'as_clause':
-            varname = children[0].varname
-            children = children[1:]
-        else:
-            varname = None
-        ast.cmd = SelectCommand(ra_expr, toponame, varname,
-                                 reactive, constraints, opt_obj)
-
-    def opt_clause(self, ast):
-        _, opt_obj, _ = ast.children
-        ast.opt_obj = opt_obj
-
-    def select_clause(self, ast):
-        mode, ra_expr, _, toponame = ast.children
-        ast.reactive = mode == 'WATCH'
-        ast.ra_expr = ra_expr.expr
-        ast.toponame = toponame
-
-    def ra_expr(self, ast):
-        children = list(map(lambda c: c.value, ast.children))
+        return VarRef(waypoint, path)
+
+    def select_statement(self, children):
+        clauses = dict(children)
+        select = clauses['select_clause']
+        return SelectCommand(select['ra_expr'], select['toponame'],
+                             clauses.get('as_clause', None),
+                             select['reactive'],
+                             clauses.get('where_clause', None),
+                             clauses.get('opt_clause', None),
+                             clauses.get('limit_clause', None))
+
+    def opt_clause(self, children):
+        _, opt_obj, _ = children
+        return 'opt_clause', opt_obj
+
+    def select_clause(self, children):
+        mode, ra_expr, _, toponame = children
+        return 'select_clause', {
+            'reactive': mode == 'WATCH',
+            'ra_expr': ra_expr,
+            'toponame': toponame
+        }
+
+    def ra_expr(self, children):
+        children = list(map(lambda c: c.value, children))
         waypoints = children[::2]
         patterns = children[1::2]
-        ast.expr = RouteAlgebraExpr(waypoints, patterns)
+        return RouteAlgebraExpr(waypoints, patterns)
+
+    def where_clause(self, children):
+        _, constraints = children
+        return 'where_clause', constraints
 
-    def where_clause(self, ast):
-        _, constraints = ast.children
-        ast.constraints = constraints.constraints
+    def as_clause(self, children):
+        return 'as_clause', children[1]
 
-    def as_clause(self, ast):
-        ast.varname = ast.children[1]
+    def limit_clause(self, children):
+        limit = int(children[1].value)
+        if limit < 1:
+            raise Exception('LIMIT must be at least 1')
+        return 'limit_clause', limit
 
-    def drop_statement(self, ast):
-        ast.cmd = DropCommand(ast.children[1].value)
+    def drop_statement(self, children):
+        return DropCommand(children[1])
 
-    def show_statement(self, ast):
-        if len(ast.children) == 2:
+    def show_statement(self, children):
+        if len(children) == 2:
             selection = None
         else:
-            selection = ast.children[2].selection
-        var_ref = ast.children[1].value
-        ast.cmd = ShowCommand(var_ref, selection)
+            selection = children[2]
+        return ShowCommand(children[1], selection)
 
-    def default(self, ast):
-        ast.value = ast.children[0].value
+    def explain_statement(self, children):
+        mode, cmd = children
+        if isinstance(cmd, ExplainCommand):
+            raise Exception('%s cannot be explained' % (cmd))
+        return ExplainCommand(cmd, mode == 'PROFILE')
 
-    def value(self, ast):
-        print(ast)
+    def default(self, children):
+        return children[0]
 
-    def number(self, ast):
-        value = ast.children[0].value
+    def number(self, children):
+        value = children[0].value
         if '.' in value:
-            ast.value = Value('float', float(value))
+            return Value('float', float(value))
         else:
-            ast.value = Value('int', int(value))
+            return Value('int', int(value))
 
-    def string(self, ast):
-        value = ast.children[0].value
-        ast.value = Value('string', value.strip('\"'))
+    def string(self, children):
+        value = children[0].value
+        return Value('string', value.strip('\"'))
+
+    def param(self, children):
+        return Value('param', children[0].value[1:])
 
     def compile(self, program, show_ast=False):
-        self.commands = []
+        program = normalize(program)
+        with self.lock:
+            commands = self.programs.get(program, None)
+            if commands is not None and not show_ast:
+                self.programs.move_to_end(program)
+                return deepcopy(commands)
+
         ast = self.parser.parse(program)
         if show_ast:
             print(ast.pretty())
-        self.visit(ast)
-        return self.commands
+        try:
+            commands = self.transform(ast)
+        except VisitError as e:
+            raise e.orig_exc
+
+        # The session mutates commands while executing them, so callers
+        # always get a private copy of the cached program.
+        with self.lock:
+            self.programs[program] = commands
+            if len(self.programs) > self.cache_size:
+                self.programs.popitem(last=False)
+        return deepcopy(commands)
 
 if __name__ == '__main__':
     import sys
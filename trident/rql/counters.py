@@ -0,0 +1,43 @@
+from contextlib import contextmanager
+from threading import local
+
+import numpy as np
+
+current = local()
+
+def active():
+    return getattr(current, 'counts', None) is not None
+
+def count(name, n):
+    # Adds to a counter of the PROFILE running in this thread, if any.
+    counts = getattr(current, 'counts', None)
+    if counts is not None:
+        counts[name] = counts.get(name, 0) + n
+
+def settled(dist):
+    # The nodes that a full search reached, from its distances.
+    if active():
+        count('settled', int(np.isfinite(dist).sum()))
+
+def expanding(weight):
+    # Wraps the weight function of a networkx search to count the nodes it
+    # expands, which are the ones it settled.
+    if not active():
+        return weight
+    expanded = set()
+    def counted(u, v, d):
+        if u not in expanded:
+            expanded.add(u)
+            count('settled', 1)
+        return weight(u, v, d)
+    return counted
+
+@contextmanager
+def counting():
+    # Collects the counters of the block into the yielded dict.
+    previous = getattr(current, 'counts', None)
+    current.counts = {}
+    try:
+        yield current.counts
+    finally:
+        current.counts = previous
@@ -0,0 +1,154 @@
+from trident.rql import counters, deadline
+from trident.rql.paths import INF, Segment
+
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+import numpy as np
+
+NO_PRED = -9999
+
+class CSRGraph():
+    # The links of a topology as a compressed sparse row adjacency, with both
+    # directions of every link sorted by (row, column). `eids` maps every
+    # entry back to its link, so weights and link masks are plain gathers.
+    def __init__(self, n, sources, targets):
+        m = len(sources)
+        rows = np.concatenate([sources, targets]).astype(np.int32)
+        cols = np.concatenate([targets, sources]).astype(np.int32)
+        eids = np.concatenate([np.arange(m), np.arange(m)]).astype(np.int32)
+        order = np.lexsort((cols, rows))
+        self.n = n
+        self.rows = rows[order]
+        self.cols = cols[order]
+        self.eids = eids[order]
+
+    def matrix(self, weights, edge_mask=None):
+        rows, cols, w = self.rows, self.cols, weights[self.eids]
+        if edge_mask is not None:
+            keep = edge_mask[self.eids]
+            rows, cols, w = rows[keep], cols[keep], w[keep]
+        if len(w) > 0:
+            # Parallel links collapse into the cheapest one.
+            start = np.flatnonzero(np.r_[True, (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])])
+            w = np.minimum.reduceat(w, start)
+            rows, cols = rows[start], cols[start]
+        indptr = np.searchsorted(rows, np.arange(self.n + 1))
+        return csr_matrix((w, cols, indptr), shape=(self.n, self.n))
+
+    def footprint(self):
+        return self.rows.nbytes + self.cols.nbytes + self.eids.nbytes
+
+def trace(pred, target):
+    path = [target]
+    while pred[path[-1]] != NO_PRED:
+        path += [int(pred[path[-1]])]
+    path.reverse()
+    return path
+
+class CSRSearch():
+    # Path searches on a weighted CSR matrix, with the same interface as
+    # paths.PathSearch. Waypoints outside `node_mask` are ignored, like the
+    # nodes missing from a filtered networkx view. With an `executor`, the
+    # searches of all segments run on its worker pool, and only the sources
+    # on the resulting path are searched again to trace it.
+    def __init__(self, matrix, ids, index, node_mask=None, executor=None):
+        self.matrix = matrix
+        self.ids = ids
+        self.index = index
+        self.node_mask = node_mask
+        self.executor = executor
+        self.trees = {}
+
+    def selected(self, n):
+        return self.node_mask is None or bool(self.node_mask[self.index[n]])
+
+    def lookup(self, nodes):
+        return [self.index[n] for n in nodes if self.selected(n)]
+
+    def path(self, pred, target):
+        return [self.ids[i] for i in trace(pred, target)]
+
+    def tree(self, source):
+        if source not in self.trees:
+            dist, pred = dijkstra(self.matrix, indices=source, return_predecessors=True)
+            counters.settled(dist)
+            self.trees[source] = pred
+        return self.trees[source]
+
+    def search(self, sources, chunk=64):
+        # Single source searches from all the sources, in chunks between
+        # which the deadline of the query is checked.
+        if len(sources) <= chunk:
+            deadline.check()
+            dist, pred = dijkstra(self.matrix, indices=sources, return_predecessors=True)
+            counters.settled(dist)
+            return dist, pred
+        n = self.matrix.shape[0]
+        dist = np.empty((len(sources), n))
+        pred = np.empty((len(sources), n), dtype=np.int32)
+        for k in range(0, len(sources), chunk):
+            deadline.check()
+            dist[k:k + chunk], pred[k:k + chunk] = dijkstra(self.matrix, indices=sources[k:k + chunk],
+                                                            return_predecessors=True)
+        counters.settled(dist)
+        return dist, pred
+
+    def best_path(self, sources, targets):
+        s, t = self.lookup(sources), self.lookup(targets)
+        if len(s) == 0 or len(t) == 0:
+            return INF, None
+        dist, pred, _ = dijkstra(self.matrix, indices=s, min_only=True,
+                                 return_predecessors=True)
+        counters.settled(dist)
+        k = t[int(np.argmin(dist[t]))]
+        if dist[k] == np.inf:
+            return INF, None
+        return float(dist[k]), self.path(pred, k)
+
+    def distances(self, sources):
+        s = self.lookup(sources)
+        if len(s) == 0:
+            return np.full(self.matrix.shape[0], INF)
+        dist = dijkstra(self.matrix, indices=s, min_only=True)
+        counters.settled(dist)
+        return dist
+
+    def segment(self, sources, targets):
+        return self.segments([(sources, targets)])[0]
+
+    def segments(self, pairs):
+        tasks = []
+        for sources, targets in pairs:
+            rows = np.array([i for i, n in enumerate(sources) if self.selected(n)], dtype=np.int64)
+            cols = np.array([j for j, n in enumerate(targets) if self.selected(n)], dtype=np.int64)
+            s = [self.index[sources[i]] for i in rows]
+            t = [self.index[targets[j]] for j in cols]
+            tasks += [(rows, cols, s, t)]
+
+        searches = [(s, t) for _, _, s, t in tasks if len(s) > 0 and len(t) > 0]
+        parallel = (self.executor is not None
+                    and sum(len(s) for s, _ in searches) > 1)
+        if parallel:
+            dists = iter(self.executor.costs(self.matrix, searches))
+
+        segments = []
+        for (sources, targets), (rows, cols, s, t) in zip(pairs, tasks):
+            costs = np.full((len(sources), len(targets)), INF)
+            if len(s) == 0 or len(t) == 0:
+                segments += [Segment(sources, targets, costs, None)]
+                continue
+            if parallel:
+                costs[np.ix_(rows, cols)] = next(dists)
+                trace = lambda i, j, sources=sources, targets=targets: \
+                    self.path(self.tree(self.index[sources[i]]), self.index[targets[j]])
+            else:
+                dist, pred = self.search(s)
+                costs[np.ix_(rows, cols)] = dist[:, t]
+                # Rows of `dist` and `pred` follow the sources that are in
+                # the graph.
+                row_of = {int(i): k for k, i in enumerate(rows)}
+                trace = lambda i, j, pred=pred, row_of=row_of, targets=targets: \
+                    self.path(pred[row_of[i]], self.index[targets[j]])
+            segments += [Segment(sources, targets, costs, trace)]
+        return segments
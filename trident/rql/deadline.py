@@ -0,0 +1,47 @@
+from contextlib import contextmanager
+from threading import local
+
+import time
+
+current = local()
+
+class Deadline():
+    # When a query has to give up, after `timeout` seconds or once it is
+    # cancelled. Searches check it between steps, so a query stops at the
+    # next check rather than at once.
+    def __init__(self, timeout=None):
+        self.expires = None if timeout is None else time.monotonic() + timeout
+        self.cancelled = False
+        self.exceeded = False
+
+    def remaining(self):
+        if self.expires is None:
+            return None
+        return max(0.0, self.expires - time.monotonic())
+
+    def cancel(self):
+        self.cancelled = True
+
+    def check(self):
+        if self.cancelled:
+            raise Exception('Query cancelled')
+        if self.expires is not None and time.monotonic() >= self.expires:
+            self.exceeded = True
+            raise Exception('Query deadline exceeded')
+
+def check():
+    # Raises if the query of the current thread has to give up.
+    deadline = getattr(current, 'deadline', None)
+    if deadline is not None:
+        deadline.check()
+
+@contextmanager
+def running(deadline):
+    # Checks in this thread use `deadline` until the block ends. None lets
+    # the block run to completion.
+    previous = getattr(current, 'deadline', None)
+    current.deadline = deadline
+    try:
+        yield deadline
+    finally:
+        current.deadline = previous
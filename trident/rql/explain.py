@@ -0,0 +1,163 @@
+from trident.rql import counters
+from trident.rql.common import SelectCommand, SetCommand, ShowCommand
+from trident.rql.paths import k_shortest_paths, merge_segments
+
+from itertools import islice
+
+import time
+
+def topology_info(topo):
+    return {
+        'version': topo.version,
+        'engine': topo.engine,
+        'nodes': len(topo.node_table),
+        'links': len(topo.edge_table)
+    }
+
+def kept(mask, total):
+    return total if mask is None else int(mask.sum())
+
+def search_plan(session, topo, cmd, node_mask, waypoints):
+    # The search that runs the SELECT, as session.select() would pick it.
+    if cmd.limit is not None:
+        return {'engine': 'networkx', 'algorithm': 'k_shortest_paths', 'limit': cmd.limit}
+    engine = topo.search_engine(node_mask, cmd.opt_obj, session.executor)
+    plan = {'engine': engine}
+    if engine == 'oracle':
+        oracle = topo.oracles.get(str(cmd.opt_obj), None)
+        plan['oracle'] = None if oracle is None else type(oracle).__name__
+    if len(waypoints) == 2:
+        single = len(waypoints[0]) == 1 and len(waypoints[1]) == 1
+        plan['algorithm'] = 'bidirectional' if engine == 'networkx' and single else 'best_path'
+    else:
+        plan['algorithm'] = 'segments'
+        plan['segments'] = len(waypoints) - 1
+        plan['sources'] = sum(len(w) for w in waypoints[:-1])
+    plan['parallel'] = (engine == 'csr' and session.executor is not None
+                        and len(waypoints) > 2 and plan['sources'] > 1)
+    return plan
+
+def select_plan(session, topo, cmd):
+    # The constraint split, the elements left by every filter, how each
+    # constraint is evaluated and the search, without searching.
+    ra_expr = cmd.ra_expr
+    wpc, nc, ec = topo.classify_constraints(ra_expr, cmd.constraints)
+    node_mask, edge_mask = topo.filter_masks(nc, ec)
+    found = topo.find_waypoints(wpc)
+    waypoints = [found[wp] for wp in ra_expr.waypoints]
+    return {
+        'statement': str(cmd),
+        'topology': topology_info(topo),
+        'cost': None if cmd.opt_obj is None else str(cmd.opt_obj),
+        'accumulation': topo.accumulation(cmd.opt_obj),
+        'waypoints': [{
+            'name': wp,
+            'constraints': str(wpc[wp]),
+            'access': topo.selection_plan('NODE', wpc[wp]),
+            'candidates': len(found[wp])
+        } for wp in ra_expr.waypoints],
+        'nodes': {
+            'constraints': None if nc is None else str(nc),
+            'access': topo.selection_plan('NODE', nc),
+            'kept': kept(node_mask, len(topo.node_table))
+        },
+        'links': {
+            'constraints': None if ec is None else str(ec),
+            'access': topo.selection_plan('LINK', ec),
+            'kept': kept(edge_mask, len(topo.edge_table))
+        },
+        'search': search_plan(session, topo, cmd, node_mask, waypoints),
+        'cached': session.cached(topo, cmd)
+    }
+
+def selection_plan(session, cmd):
+    # The elements that a SET or SHOW selects, and how.
+    selection = cmd.selection
+    plan = {'statement': str(cmd)}
+    if selection is None:
+        return plan
+    topo = session.topology(selection)
+    plan['topology'] = topology_info(topo)
+    plan['element_type'] = selection.element_type
+    plan['constraints'] = None if selection.constraints is None else str(selection.constraints)
+    plan['access'] = topo.selection_plan(selection.element_type, selection.constraints)
+    plan['elements'] = len(topo.select_indices(selection.element_type, selection.constraints))
+    return plan
+
+def explain(session, cmd):
+    if isinstance(cmd, SelectCommand):
+        return {'plan': select_plan(session, session.topology(cmd), cmd)}
+    if isinstance(cmd, (SetCommand, ShowCommand)):
+        return {'plan': selection_plan(session, cmd)}
+    return {'plan': {'statement': str(cmd)}}
+
+class Stages():
+    # The wall time and counters of every stage of a PROFILE.
+    def __init__(self):
+        self.stages = []
+
+    def run(self, name, step):
+        with counters.counting() as counts:
+            t0 = time.perf_counter()
+            result = step()
+            ms = 1e3 * (time.perf_counter() - t0)
+        stage = {'stage': name, 'ms': ms}
+        stage.update(counts)
+        self.stages += [stage]
+        return result
+
+    def total(self):
+        return sum(s['ms'] for s in self.stages)
+
+def profile_select(session, topo, cmd, stages):
+    # The steps of topo.select_path() or topo.select_paths(), one stage
+    # each. Returns the path, or the paths of a LIMIT.
+    ra_expr = cmd.ra_expr
+    wpc, nc, ec = stages.run('classify_constraints',
+                             lambda: topo.classify_constraints(ra_expr, cmd.constraints))
+    node_mask, edge_mask = stages.run('filter', lambda: topo.filter_masks(nc, ec))
+    stages.stages[-1]['nodes'] = kept(node_mask, len(topo.node_table))
+    stages.stages[-1]['links'] = kept(edge_mask, len(topo.edge_table))
+    found = stages.run('find_waypoints', lambda: topo.find_waypoints(wpc))
+    stages.stages[-1]['candidates'] = {wp: len(found[wp]) for wp in ra_expr.waypoints}
+    waypoints = [found[wp] for wp in ra_expr.waypoints]
+
+    if cmd.limit is not None:
+        topo.check_limit(ra_expr, cmd.opt_obj)
+        g = stages.run('filtered_view', lambda: topo.filtered_view(node_mask, edge_mask))
+        paths = stages.run('k_shortest_paths', lambda: [path for cost, path in islice(
+            k_shortest_paths(g, waypoints[0], waypoints[1], topo.weight_function(cmd.opt_obj)),
+            cmd.limit)])
+        return paths if len(paths) > 0 else None
+
+    search = stages.run('path_search',
+                        lambda: topo.path_search(node_mask, edge_mask, cmd.opt_obj, session.executor))
+    if len(waypoints) == 2:
+        cost, path = stages.run('best_path', lambda: search.best_path(waypoints[0], waypoints[1]))
+    else:
+        segments = stages.run('segments', lambda: search.segments(list(zip(waypoints[:-1], waypoints[1:]))))
+        if topo.accumulation(cmd.opt_obj) != 'add':
+            cost, path = stages.run('merge_segments', lambda: search.merge(segments))
+        else:
+            cost, path = stages.run('merge_segments', lambda: merge_segments(segments))
+    return path
+
+def profile(session, cmd):
+    # Runs the command. SELECT is broken down into the stages of its
+    # search, bypassing the result cache, and any other command is a single
+    # stage whose result is kept as 'result'.
+    stages = Stages()
+    result = {}
+    if isinstance(cmd, SelectCommand) and not cmd.reactive:
+        topo = session.topology(cmd)
+        result['plan'] = select_plan(session, topo, cmd)
+        path = profile_select(session, topo, cmd, stages)
+        result['path'] = path
+        if path is not None:
+            session.assign(cmd, path)
+    else:
+        result['result'] = stages.run(type(cmd).__name__[:-len('Command')].lower(),
+                                      lambda: session.dispatch(cmd))
+    result['stages'] = stages.stages
+    result['total_ms'] = stages.total()
+    return result
@@ -0,0 +1,632 @@
+from trident.rql.common import *
+from trident.rql.layout import layout_cache
+from trident.rql.paths import PathSearch, k_shortest_paths, merge_segments
+from trident.rql.predicate import Predicate
+from trident.rql.store import Column, ElementTable, ElementView, DTYPES
+from trident.rql.watch import Watch
+
+import networkx as nx
+from itertools import count
+from threading import Lock
+
+import numpy as np
+
+try:
+    from trident.rql.csr import CSRGraph, CSRSearch
+    from trident.rql.bottleneck import BottleneckSearch
+    from trident.rql.oracle import build_oracle
+except ImportError:
+    CSRGraph = None
+    BottleneckSearch = None
+
+ENGINES = ['networkx', 'csr']
+
+# Every state of every GraphDB gets its own version, so equal versions mean
+# equal contents.
+versions = count(1)
+
+def cleanup(origin, eid):
+    element = origin.copy()
+    if 'x' in element:
+        del element['x']
+    if 'y' in element:
+        del element['y']
+    if 'label' in element:
+        del element['label']
+    element['id'] = eid
+    return list(element.keys()), element
+
+def add_columns(table, elements):
+    names = {}
+    for e in elements:
+        for k in e:
+            names.setdefault(k, None)
+    for name in names:
+        present = [name in e for e in elements]
+        values = [e.get(name, None) for e in elements]
+        if all(present):
+            present = None
+        table.add_column(name, Column.from_values(values, present))
+
+def make_port_table(nodes, sources, targets):
+    ports = {}
+    for eid, (u, v) in enumerate(zip(sources, targets)):
+        u, v = nodes[u], nodes[v]
+        ports['%s:%s' % (u, eid)] = (u, eid)
+        ports['%s:%s' % (v, eid)] = (v, eid)
+    table = ElementTable(ports)
+    table.add_column('id', Column.from_values(list(ports)))
+    table.add_column('node', Column.from_values([n for n, _ in ports.values()]))
+    table.add_column('link', Column.from_values([e for _, e in ports.values()]))
+    return table
+
+def make_topology(nodes, sources, targets, attrs={}):
+    # The structure of a topology, without any attributes. Edges are keyed
+    # by their index in the edge table, which lets filtered views and weight
+    # functions address the columns directly.
+    g = nx.MultiGraph()
+    g.graph.update(attrs)
+    g.add_nodes_from(nodes)
+    g.add_edges_from((nodes[u], nodes[v], e)
+                     for e, (u, v) in enumerate(zip(sources.tolist(), targets.tolist())))
+    return g
+
+class Structure():
+    # The nodes and links of a topology, shared by all forks of a GraphDB.
+    # The networkx graph and the CSR adjacency are only built by the engine
+    # that needs them.
+    def __init__(self, nodes, sources, targets, attrs={}):
+        self.nodes = nodes
+        self.sources = sources
+        self.targets = targets
+        self.attrs = dict(attrs)
+        self.graph = None
+        self.csr = None
+        self.lock = Lock()
+
+    def networkx(self):
+        with self.lock:
+            if self.graph is None:
+                self.graph = make_topology(self.nodes, self.sources, self.targets, self.attrs)
+            return self.graph
+
+    def compressed(self):
+        with self.lock:
+            if self.csr is None:
+                self.csr = CSRGraph(len(self.nodes), self.sources, self.targets)
+            return self.csr
+
+
+class GraphDB():
+    def __init__(self, g, engine='networkx'):
+        nodes = list(g.nodes())
+        edges = list(g.edges(data=True))
+        nindex = {n: i for i, n in enumerate(nodes)}
+
+        node_table = ElementTable(nodes)
+        add_columns(node_table, [g.nodes[n] for n in nodes])
+        node_table.add_column('id', Column.from_values(nodes))
+
+        edge_table = ElementTable(range(len(edges)))
+        add_columns(edge_table, [e for _, _, e in edges])
+        edge_table.add_column('id', Column.from_values(list(range(len(edges)))))
+        edge_table.add_column('source', Column.from_values([u for u, _, _ in edges]))
+        edge_table.add_column('target', Column.from_values([v for _, v, _ in edges]))
+        sources = np.array([nindex[u] for u, _, _ in edges], dtype=np.int64)
+        targets = np.array([nindex[v] for _, v, _ in edges], dtype=np.int64)
+
+        port_table = make_port_table(nodes, sources, targets)
+
+        node_prop_specs = {p: DataSpec(p, 'str', '') for p in node_table.columns}
+        edge_prop_specs = {p: DataSpec(p, 'str', '') for p in edge_table.columns}
+
+        # All attributes now live in the tables, so the networkx graph only
+        # keeps the structure.
+        self.setup(Structure(nodes, sources, targets, g.graph), engine,
+                   [node_table, edge_table, port_table],
+                   [node_prop_specs, edge_prop_specs, {}], {})
+        self.create_default_indexes()
+
+    def setup(self, structure, engine, tables, specs, cost_specs):
+        # Every field of a GraphDB, whether it is loaded, forked or read from
+        # a snapshot. The caches start empty, in a version of their own.
+        self.structure = structure
+        self.sources = structure.sources
+        self.targets = structure.targets
+        self.use_engine(engine)
+
+        self.node_table, self.edge_table, self.port_table = tables
+        self.node_prop_specs, self.edge_prop_specs, self.port_prop_specs = specs
+        self.cost_specs = cost_specs
+
+        self.weights = {}
+        self.oracles = {}
+        self.views = {}
+        self.watches = []
+        self.version = next(versions)
+
+    def create_default_indexes(self):
+        self.node_table.create_index('id')
+        for name in ['id', 'source', 'target']:
+            self.edge_table.create_index(name)
+        self.port_table.create_index('id')
+
+    def create_index(self, element_type, propname, kind='hash'):
+        table, _ = self.get_table(element_type)
+        if propname not in table.columns:
+            raise Exception('%s is not defined for %s' % (propname, element_type))
+        table.create_index(propname, kind)
+
+    def create_oracle(self, costname):
+        # Precomputes the distances of an additive COST, which then answers
+        # the SELECTs on the whole topology. The COST may be defined later.
+        if CSRGraph is None:
+            raise Exception('Distance oracles need scipy')
+        self.oracles.setdefault(str(costname), None)
+
+    def oracle(self, costname):
+        # Built on first use, and patched or rebuilt when the COST changes.
+        weights = self.cost_weights(costname)
+        oracle = self.oracles.get(costname, None)
+        if oracle is not None:
+            oracle = oracle.sync(weights)
+        if oracle is None:
+            oracle = build_oracle(self.structure.compressed(), self.sources, self.targets,
+                                  weights, self.node_table.ids, self.node_table.index)
+        self.oracles[costname] = oracle
+        return oracle
+
+    def use_engine(self, engine):
+        if engine not in ENGINES:
+            raise Exception('Unknown engine %s' % (engine))
+        if engine == 'csr' and CSRGraph is None:
+            raise Exception('The csr engine needs scipy')
+        self.engine = engine
+
+    @property
+    def raw_graph(self):
+        return self.structure.networkx()
+
+    @property
+    def nodes(self):
+        return ElementView(self.node_table)
+
+    @property
+    def edges(self):
+        return ElementView(self.edge_table)
+
+    @property
+    def ports(self):
+        return ElementView(self.port_table)
+
+    def fork(self):
+        gdb = GraphDB.__new__(GraphDB)
+        gdb.setup(self.structure, self.engine,
+                  [self.node_table.fork(), self.edge_table.fork(), self.port_table.fork()],
+                  [dict(self.node_prop_specs), dict(self.edge_prop_specs), dict(self.port_prop_specs)],
+                  dict(self.cost_specs))
+        # Until either of them changes, a fork has the same contents, so it
+        # shares the version and the caches. Oracles are never patched in
+        # place, so forks can share them.
+        gdb.weights = dict(self.weights)
+        gdb.oracles = dict(self.oracles)
+        gdb.version = self.version
+        return gdb
+
+    def successor(self):
+        # The next version of the topology, which writers change while
+        # readers of this one keep a consistent view. Unlike a fork, it
+        # takes over the watches.
+        gdb = self.fork()
+        gdb.watches = list(self.watches)
+        return gdb
+
+    def footprint(self):
+        size = self.sources.nbytes + self.targets.nbytes
+        for table in [self.node_table, self.edge_table, self.port_table]:
+            size += table.footprint()
+        return size
+
+    def coordinates(self):
+        table = self.node_table
+        x = table.columns.get('Longitude', None)
+        y = table.columns.get('Latitude', None)
+        if x is None or y is None or x.present is not None or y.present is not None:
+            return None
+        return dict(zip(table.ids, zip(x.tolist(), y.tolist())))
+
+    def get_table(self, element_type):
+        if element_type == 'NODE':
+            return self.node_table, self.node_prop_specs
+        elif element_type == 'LINK':
+            return self.edge_table, self.edge_prop_specs
+        else:
+            return self.port_table, self.port_prop_specs
+
+    def data(self):
+        g = self.raw_graph
+        pos = layout_cache.get(g, self.coordinates())
+        table = self.node_table
+
+        nodes = []
+        for i, n in enumerate(table.ids):
+            node = {}
+            node['id'] = n
+            node['r'] = g.degree(n)
+            node['x'] = pos[n][0]
+            node['y'] = pos[n][1]
+            node['label'] = table.get(i, 'label', '')
+            node['proplist'], node['properties'] = cleanup(table.row(i), n)
+            nodes += [node]
+
+        links = []
+        for i in range(len(self.edge_table)):
+            edge = {}
+            edge['id'] = len(links)
+            edge['source'] = int(self.sources[i])
+            edge['target'] = int(self.targets[i])
+            edge['proplist'], edge['properties'] = cleanup(self.edge_table.row(i), len(links))
+            links += [edge]
+
+        return {'nodes': nodes, 'links': links}
+
+    def define_annotation(self, data_type, data_spec, selection):
+        if data_type == 'COST':
+            if data_spec.accum_func == '+':
+                data_spec.accum_func = 'add'
+            if data_spec.accum_func not in ['add', 'min', 'max']:
+                raise Exception('Accumulative Function %s is not supported'
+                                % (data_spec.accum_func))
+            self.cost_specs[data_spec.varname] = data_spec
+            print('%s is defined as COST' % (data_spec.varname))
+        data_spec.element_type = selection.element_type
+        table, props = self.get_table(selection.element_type)
+        props[data_spec.varname] = data_spec
+        # The default is stored once in the column instead of in every element.
+        default = data_spec.interpret(data_spec.default_value.value)
+        column = Column(len(table), default, DTYPES[data_spec.vartype])
+        table.add_column(data_spec.varname, column)
+        self.weights.pop(data_spec.varname, None)
+        self.version = next(versions)
+        return self.refresh_watches(data_spec.varname)
+
+    def set_annotation(self, data_type, var_ref, value, selection):
+        if data_type == 'COST':
+            if var_ref not in self.cost_specs:
+                raise Exception('%s is not defined as COST' % (var_ref))
+        elif var_ref in self.cost_specs:
+            raise Exception('%s is defined as COST' % (var_ref))
+        element_type = selection.element_type
+        if element_type == 'NODE':
+            if var_ref not in self.node_prop_specs:
+                raise Exception('%s is not defined for %s' % (var_ref, element_type))
+            data_spec = self.node_prop_specs[var_ref]
+        elif element_type == 'LINK':
+            if var_ref not in self.edge_prop_specs:
+                raise Exception('%s is not defined for %s' % (var_ref, element_type))
+            data_spec = self.edge_prop_specs[var_ref]
+        else:
+            if var_ref not in self.port_prop_specs:
+                raise Exception('%s is not defined for %s' % (var_ref, element_type))
+            data_spec = self.port_prop_specs[var_ref]
+        if data_spec.element_type != selection.element_type:
+            raise Exception('Bad selection: element type mismatch')
+
+        return self.set_prop_values(var_ref, value, selection)
+
+    def set_prop_values(self, propname, value, selection):
+        element_type = selection.element_type
+        table, props = self.get_table(element_type)
+        indices = self.select_indices(element_type, selection.constraints)
+        value = props[propname].interpret(value.value)
+        column = table.writable(propname)
+        if len(indices) == len(table):
+            column.fill(value)
+        else:
+            column.assign(indices, value)
+        self.weights.pop(propname, None)
+        self.version = next(versions)
+        return self.refresh_watches(propname)
+
+    def watch(self, cmd, executor=None):
+        watch = Watch(cmd)
+        watch.compute(self, executor)
+        if watch.path is None:
+            ra_expr = cmd.ra_expr
+            raise Exception('No path from %s to %s' % (ra_expr.waypoints[0], ra_expr.waypoints[-1]))
+        self.watches += [watch]
+        return watch
+
+    def refresh_watches(self, propname):
+        # The watches whose path changed.
+        changed = []
+        for i, watch in enumerate(self.watches):
+            self.watches[i] = watch.refresh(self, propname)
+            if self.watches[i].path != watch.path:
+                changed += [self.watches[i]]
+        return changed
+
+    def select_indices(self, element_type, constraints):
+        table, props = self.get_table(element_type)
+        candidates = np.arange(len(table))
+        if constraints is None:
+            return candidates
+        return Predicate(constraints, table, props).select(candidates)
+
+    def selection_plan(self, element_type, constraints):
+        # How the constraints would be evaluated on the elements.
+        table, props = self.get_table(element_type)
+        return Predicate(constraints, table, props).plan
+
+    def select_element(self, element_type, constraints):
+        table, _ = self.get_table(element_type)
+        return [table.ids[i] for i in self.select_indices(element_type, constraints)]
+
+    def select_path(self, ra_expr, constraints, opt_obj, executor=None):
+        wpc, nc, ec = self.classify_constraints(ra_expr, constraints)
+        node_mask, edge_mask = self.filter_masks(nc, ec)
+        search = self.path_search(node_mask, edge_mask, opt_obj, executor)
+        waypoints = self.find_waypoints(wpc)
+        cost, path = self.find_route(search, [waypoints[wp] for wp in ra_expr.waypoints])
+        if path is None:
+            raise Exception('No path from %s to %s' % (ra_expr.waypoints[0], ra_expr.waypoints[-1]))
+        return path
+
+    def select_paths(self, ra_expr, constraints, opt_obj):
+        # The simple paths between two waypoints, cheapest first, searched
+        # for one at a time as the returned generator is consumed.
+        self.check_limit(ra_expr, opt_obj)
+        wpc, nc, ec = self.classify_constraints(ra_expr, constraints)
+        g = self.filter_graph(nc, ec)
+        waypoints = self.find_waypoints(wpc)
+        sources, targets = [waypoints[wp] for wp in ra_expr.waypoints]
+        paths = k_shortest_paths(g, sources, targets, self.weight_function(opt_obj))
+        return (path for cost, path in paths)
+
+    def check_limit(self, ra_expr, opt_obj):
+        if len(ra_expr.waypoints) != 2:
+            raise Exception('LIMIT is only supported between two waypoints')
+        accum_func = self.accumulation(opt_obj)
+        if accum_func != 'add':
+            raise Exception('LIMIT is not supported for %s COST %s' % (accum_func, opt_obj))
+
+    def find_route(self, search, waypoints):
+        if len(waypoints) == 2:
+            # Only the best pair matters, which one search from all the
+            # sources finds.
+            return search.best_path(waypoints[0], waypoints[1])
+        segments = search.segments(list(zip(waypoints[:-1], waypoints[1:])))
+        if BottleneckSearch is not None and isinstance(search, BottleneckSearch):
+            return search.merge(segments)
+        return merge_segments(segments)
+
+    def accumulation(self, opt_obj):
+        spec = None if opt_obj is None else self.cost_specs.get(str(opt_obj), None)
+        return 'add' if spec is None else spec.accum_func
+
+    def search_engine(self, node_mask, opt_obj, executor=None, bulk=False):
+        # Which search path_search() picks: 'bottleneck', 'oracle', 'csr'
+        # or 'networkx'.
+        accum_func = self.accumulation(opt_obj)
+        if accum_func != 'add':
+            if CSRGraph is None:
+                raise Exception('%s COST %s needs scipy' % (accum_func, opt_obj))
+            return 'bottleneck'
+        name = None if opt_obj is None else str(opt_obj)
+        if node_mask is None and name in self.oracles:
+            return 'oracle'
+        # Parallel searches share the CSR form with the workers, whatever
+        # the engine of the topology, and so do the full searches of batches.
+        if self.engine == 'csr' or ((executor is not None or bulk) and CSRGraph is not None):
+            return 'csr'
+        return 'networkx'
+
+    def path_search(self, node_mask, edge_mask, opt_obj, executor=None, bulk=False):
+        engine = self.search_engine(node_mask, opt_obj, executor, bulk)
+        if engine == 'bottleneck':
+            return BottleneckSearch(self.structure.compressed(), self.cost_weights(opt_obj),
+                                    self.accumulation(opt_obj), self.node_table.ids,
+                                    self.node_table.index, node_mask, edge_mask)
+        if engine == 'oracle':
+            return self.oracle(str(opt_obj))
+        if engine == 'csr':
+            csr = self.structure.compressed()
+            matrix = csr.matrix(self.cost_weights(opt_obj), edge_mask)
+            return CSRSearch(matrix, self.node_table.ids, self.node_table.index,
+                             node_mask, executor)
+        g = self.filtered_view(node_mask, edge_mask)
+        return PathSearch(g, self.weight_function(opt_obj), self.node_table.index)
+
+    def classify_constraints(self, ra_expr, constraints):
+        wpc, nc, ec = self.recursive_classify_constraints(constraints)
+        for wp in ra_expr.waypoints:
+            if wp not in wpc:
+                raise Exception('Missing constraints on waypoint %s' % (wp))
+            return wpc, nc, ec
+
+    def filter_masks(self, node_constraints, edge_constraints):
+        if node_constraints is None and edge_constraints is None:
+            return None, None
+        node_mask = np.zeros(len(self.node_table), dtype=np.bool_)
+        node_mask[self.select_indices('NODE', node_constraints)] = True
+        edge_mask = np.zeros(len(self.edge_table), dtype=np.bool_)
+        edge_mask[self.select_indices('LINK', edge_constraints)] = True
+        edge_mask &= node_mask[self.sources] & node_mask[self.targets]
+        return node_mask, edge_mask
+
+    def filter_graph(self, node_constraints, edge_constraints):
+        return self.filtered_view(*self.filter_masks(node_constraints, edge_constraints))
+
+    def filtered_view(self, node_mask, edge_mask):
+        if node_mask is None:
+            return self.raw_graph
+
+        index = self.node_table.index
+        node_mask = node_mask.tolist()
+        edge_mask = edge_mask.tolist()
+        return nx.subgraph_view(self.raw_graph,
+                                filter_node=lambda n: node_mask[index[n]],
+                                filter_edge=lambda u, v, e: edge_mask[e])
+
+    def cost_weights(self, opt_obj):
+        # The weight of every link for a COST, cached until the cost changes.
+        # Links without the cost count as one hop, as networkx does for
+        # missing weight attributes.
+        name = None if opt_obj is None else str(opt_obj)
+        weights = self.weights.get(name, None)
+        if weights is not None:
+            return weights
+        column = self.edge_table.columns.get(name, None)
+        if column is None:
+            weights = np.ones(len(self.edge_table), dtype=np.float64)
+        else:
+            weights = column.array().astype(np.float64)
+            if column.present is not None:
+                weights[~column.present] = 1
+        weights.flags.writeable = False
+        self.weights[name] = weights
+        return weights
+
+    def weight_function(self, opt_obj):
+        weights = self.cost_weights(opt_obj).tolist()
+        return lambda u, v, keys: min(weights[e] for e in keys)
+
+    def find_waypoints(self, waypoint_constraints):
+        waypoints = {}
+        for wp in waypoint_constraints:
+            waypoints[wp] = self.select_element('NODE', waypoint_constraints[wp])
+        return waypoints
+
+    def merge_constraints(self, lhs, op, rhs):
+        if lhs is None:
+            return rhs
+        if rhs is None:
+            return lhs
+        return CompoundConstraint(lhs, op, rhs)
+
+    def get_waypoints(self, constraints):
+        lhs = constraints.lhs
+        rhs = constraints.rhs
+        waypoints = set()
+        if isinstance(lhs, VarRef) and lhs.waypoint is not None:
+            waypoints |= {lhs.waypoint}
+        if isinstance(rhs, VarRef) and rhs.waypoint is not None:
+            waypoints |= {rhs.waypoint}
+        if len(waypoints) > 1:
+            raise Exception('Cross-waypoint constraint is not supported: %s'
+                            % (constraints))
+        if len(waypoints) == 1:
+            if isinstance(lhs, VarRef) and lhs.waypoint is None:
+                print(lhs)
+                raise Exception('Invalid constraint: %s' % (constraints))
+            if isinstance(rhs, VarRef) and rhs.waypoint is None:
+                print(rhs)
+                raise Exception('Invalid constraint: %s' % (constraints))
+        return waypoints
+
+    def lookup_data_spec(self, var_ref):
+        ref = str(var_ref)
+        if ref in self.node_prop_specs:
+            return 'NODE', self.node_prop_specs[ref]
+        if ref in self.edge_prop_specs:
+            return 'LINK', self.edge_prop_specs[ref]
+        else:
+            return None, None
+
+    def get_element_types(self, constraints):
+        lhs = constraints.lhs
+        rhs = constraints.rhs
+        element_types = set()
+        e1, s1 = self.lookup_data_spec(lhs)
+        if e1 is not None:
+            element_types |= {e1}
+        e2, s2 = self.lookup_data_spec(rhs)
+        if e2 is not None:
+            element_types |= {e2}
+        if len(element_types) > 1:
+            raise Exception('Invalid constraint: %s' % (constraints))
+        if len(element_types) == 1:
+            if isinstance(lhs, VarRef):
+                if str(lhs) in self.cost_specs:
+                    raise Exception('COST constraint is not supported: %s' % (constraints))
+            if isinstance(rhs, VarRef):
+                if str(rhs) in self.cost_specs:
+                    raise Exception('COST constraint is not supported: %s' % (constraints))
+        return element_types
+
+    def recursive_classify_constraints(self, constraints):
+        if constraints is None:
+            return {}, None, None
+        lhs, op, rhs = constraints.lhs, constraints.op, constraints.rhs
+        if isinstance(constraints, BasicConstraint):
+            waypoints = self.get_waypoints(constraints)
+            if len(waypoints) == 1:
+                waypoint = list(waypoints)[0]
+                if isinstance(lhs, VarRef):
+                    lhs = VarRef(None, lhs.path)
+                if isinstance(rhs, VarRef):
+                    rhs = VarRef(None, rhs.path)
+                constraints = BasicConstraint(lhs, op, rhs)
+                return {waypoint: constraints}, None, None
+            else:
+                element_types = self.get_element_types(constraints)
+                element_type = list(element_types)[0]
+                if element_type == 'NODE':
+                    return {}, constraints, None
+                else:
+                    return {}, None, constraints
+        elif constraints.op == 'AND':
+            wpc1, nc1, ec1 = self.recursive_classify_constraints(lhs)
+            wpc2, nc2, ec2 = self.recursive_classify_constraints(rhs)
+            wpc = {}
+            for wp in wpc1.keys() | wpc2.keys():
+                wpc[wp] = self.merge_constraints(wpc1.get(wp, None), op, wpc2.get(wp, None))
+            nc = self.merge_constraints(nc1, op, nc2)
+            ec = self.merge_constraints(ec1, op, ec2)
+            return wpc, nc, ec
+        elif constraints.op == 'OR':
+            wpc1, nc1, ec1 = self.recursive_classify_constraints(lhs)
+            wpc2, nc2, ec2 = self.recursive_classify_constraints(rhs)
+            wpc = {}
+            wpc_keys = wpc1.keys() | wpc2.keys()
+            if len(wpc_keys) > 1:
+                raise Exception("Invalid constraint: %s" % (constraints))
+            types = 0
+            if len(wpc_keys) > 0:
+                types += 1
+            if nc1 is not None or nc2 is not None:
+                types += 1
+            if ec1 is not None or ec2 is not None:
+                types += 1
+            if types != 1:
+                raise Exception('Invalid constraint: %s' % (constraints))
+            for wp in wpc_keys:
+                wpc[wp] = self.merge_constraints(wpc1.get(wp, None), op, wpc2.get(wp, None))
+            nc = self.merge_constraints(nc1, op, nc2)
+            ec = self.merge_constraints(ec1, op, ec2)
+            return wpc, nc, ec
+        elif constraints.op == 'NOT':
+            wpc1, nc1, ec1 = self.recursive_classify_constraints(lhs)
+            wpc = {}
+            for wp in wpc1:
+                wpc[wp] = self.merge_constraints(wpc1[wp], op, None)
+            nc = self.merge_constraints(nc1, op, None)
+            ec = self.merge_constraints(ec1, op, None)
+            return wpc, nc, ec
+
+    def __str__(self):
+        nps = self.node_prop_specs
+        eps = self.edge_prop_specs
+        nodes = self.nodes
+        edges = self.edges
+
+        s = ''
+        for n in nodes:
+            node = nodes[n]
+            props = ', '.join(['%s=%s' % (s, node.get(s, '')) for s in nps])
+            s += '%s: %s\n' % (n, props)
+        for e in edges:
+            edge = edges[e]
+            props = ', '.join(['%s=%s' % (s, edge.get(s, '')) for s in eps])
+            s += '%s: %s\n' % (e, props)
+        return s
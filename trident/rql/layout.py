@@ -0,0 +1,155 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from weakref import WeakKeyDictionary
+
+import networkx as nx
+import hashlib
+import json
+import logging
+import math
+import os
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+def structural_hash(g):
+    h = hashlib.sha1()
+    for n in sorted(map(str, g.nodes())):
+        h.update(n.encode('utf-8') + b'\0')
+    h.update(b'\1')
+    edges = sorted(tuple(sorted((str(u), str(v)))) for u, v in g.edges())
+    for u, v in edges:
+        h.update(u.encode('utf-8') + b'\0' + v.encode('utf-8') + b'\0')
+    return h.hexdigest()
+
+def fallback_layout(g, coords=None):
+    # Topology Zoo nodes usually carry their coordinates, which makes a good
+    # layout for free. Otherwise place the nodes on a circle.
+    if coords is not None:
+        return {n: (float(x), float(y)) for n, (x, y) in coords.items()}
+    nodes = list(g.nodes())
+    radius = 10.0 * max(len(nodes), 1)
+    step = 2 * math.pi / max(len(nodes), 1)
+    return {n: (radius * math.cos(i * step), radius * math.sin(i * step))
+            for i, n in enumerate(nodes)}
+
+def graphviz_layout(g):
+    return nx.nx_pydot.graphviz_layout(g)
+
+class LayoutCache():
+    # Layouts are computed once per topology structure: in a background worker
+    # when the topology is loaded, and kept in memory and in `cache_dir`. Until
+    # a layout is ready, or when the graph has more than `max_nodes` nodes,
+    # SHOW gets the fallback layout instead of waiting for graphviz. At most
+    # `capacity` layouts are kept in memory, and a failed layout is tried
+    # again after `retry` seconds.
+    def __init__(self, cache_dir=None, workers=1, max_nodes=2000, capacity=256, retry=60):
+        if cache_dir is None:
+            cache_dir = os.path.join(tempfile.gettempdir(), 'trident-layouts')
+        self.cache_dir = cache_dir
+        self.max_nodes = max_nodes
+        self.capacity = capacity
+        self.retry = retry
+        self.executor = ThreadPoolExecutor(workers)
+        self.keys = WeakKeyDictionary()
+        self.layouts = OrderedDict()
+        self.pending = {}
+        self.failed = {}
+        self.lock = Lock()
+
+    def key(self, g):
+        with self.lock:
+            key = self.keys.get(g, None)
+        if key is None:
+            key = structural_hash(g)
+            with self.lock:
+                self.keys[g] = key
+        return key
+
+    def filename(self, key):
+        return os.path.join(self.cache_dir, '%s.json' % (key))
+
+    def keep(self, key, pos):
+        # Called with the lock held
+        self.layouts[key] = pos
+        self.layouts.move_to_end(key)
+        while len(self.layouts) > self.capacity:
+            self.layouts.popitem(last=False)
+
+    def lookup(self, key):
+        with self.lock:
+            if key in self.layouts:
+                self.layouts.move_to_end(key)
+                return self.layouts[key]
+        try:
+            with open(self.filename(key)) as f:
+                pos = {n: tuple(p) for n, p in json.load(f).items()}
+        except (OSError, ValueError):
+            return None
+        with self.lock:
+            self.keep(key, pos)
+        return pos
+
+    def store(self, key, pos):
+        with self.lock:
+            self.keep(key, pos)
+            self.failed.pop(key, None)
+            del self.pending[key]
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmpname = '%s.%d.tmp' % (self.filename(key), os.getpid())
+            with open(tmpname, 'w') as f:
+                json.dump(pos, f)
+            os.replace(tmpname, self.filename(key))
+        except OSError as e:
+            logger.warning('Failed to save layout %s: %s', key, e)
+
+    def compute(self, key, g, coords):
+        try:
+            pos = graphviz_layout(g)
+        except Exception as e:
+            # SHOW keeps getting the fallback layout until graphviz works.
+            logger.warning('graphviz layout failed, using fallback layout: %s', e)
+            with self.lock:
+                self.failed[key] = time.monotonic()
+                del self.pending[key]
+            return
+        self.store(key, pos)
+
+    def prefetch(self, g, coords=None):
+        if g.number_of_nodes() > self.max_nodes:
+            return
+        key = self.key(g)
+        if self.lookup(key) is not None:
+            return
+        with self.lock:
+            if key in self.pending or key in self.layouts:
+                return
+            if key in self.failed and time.monotonic() - self.failed[key] < self.retry:
+                return
+            self.pending[key] = self.executor.submit(self.compute, key, g, coords)
+
+    def wait(self, g):
+        # Blocks until the layout that is being computed for `g`, if any,
+        # is ready.
+        with self.lock:
+            future = self.pending.get(self.keys.get(g, None), None)
+        if future is not None:
+            future.result()
+
+    def get(self, g, coords=None):
+        key = self.key(g)
+        pos = self.lookup(key)
+        if pos is not None:
+            return pos
+        if g.number_of_nodes() > self.max_nodes:
+            pos = fallback_layout(g, coords)
+            with self.lock:
+                self.keep(key, pos)
+            return pos
+        self.prefetch(g, coords)
+        return fallback_layout(g, coords)
+
+layout_cache = LayoutCache()
@@ -0,0 +1,182 @@
+from trident.rql import counters
+from trident.rql.csr import CSRSearch, trace
+from trident.rql.paths import INF, Segment
+
+from collections import OrderedDict
+from copy import copy
+from scipy.sparse.csgraph import dijkstra
+from threading import Lock
+
+import numpy as np
+
+def build_oracle(csr, sources, targets, weights, ids, index, max_nodes=2048):
+    if csr.n <= max_nodes:
+        return DistanceTable(csr, sources, targets, weights, ids, index)
+    return SourceTrees(csr, sources, targets, weights, ids, index)
+
+class DistanceTable():
+    # All-pairs distances and predecessors of a COST, for topologies small
+    # enough to keep n^2 of them. Lower link weights are patched in by
+    # relaxing every pair through the changed links, into a copy since older
+    # versions of the topology may still read this one; higher ones need a
+    # new table, since the pairs that used them cannot be told apart.
+    max_patch = 32
+
+    def __init__(self, csr, sources, targets, weights, ids, index):
+        self.csr = csr
+        self.sources = sources
+        self.targets = targets
+        self.weights = weights
+        self.ids = ids
+        self.index = index
+        dist, pred = dijkstra(csr.matrix(weights), return_predecessors=True)
+        self.dist = dist
+        self.pred = pred.astype(np.int32)
+
+    def sync(self, weights):
+        # The table for `weights`, or None if it has to be rebuilt.
+        if weights is self.weights:
+            return self
+        changed = np.flatnonzero(weights != self.weights)
+        if (weights[changed] > self.weights[changed]).any() or len(changed) > self.max_patch:
+            return None
+        table = copy(self)
+        for e in changed:
+            u, v, w = int(self.sources[e]), int(self.targets[e]), weights[e]
+            if u != v:
+                table.relax(u, v, w)
+                table.relax(v, u, w)
+        table.weights = weights
+        return table
+
+    def relax(self, u, v, w):
+        # Paths i -> u -> v -> j that got cheaper take the predecessors of
+        # v -> j, and u before v.
+        alt = self.dist[:, u, None] + w + self.dist[None, v, :]
+        better = alt < self.dist
+        if not better.any():
+            return
+        pred = self.pred[v].copy()
+        pred[v] = u
+        self.dist = np.where(better, alt, self.dist)
+        self.pred = np.where(better, pred[None, :], self.pred).astype(np.int32)
+
+    def lookup(self, nodes):
+        return [self.index[n] for n in nodes]
+
+    def path(self, i, j):
+        return [self.ids[k] for k in trace(self.pred[i], j)]
+
+    def best_path(self, sources, targets):
+        s, t = self.lookup(sources), self.lookup(targets)
+        if len(s) == 0 or len(t) == 0:
+            return INF, None
+        costs = self.dist[np.ix_(s, t)]
+        i, j = np.unravel_index(int(np.argmin(costs)), costs.shape)
+        if costs[i, j] == INF:
+            return INF, None
+        return float(costs[i, j]), self.path(s[i], t[j])
+
+    def distances(self, sources):
+        s = self.lookup(sources)
+        if len(s) == 0:
+            return np.full(len(self.ids), INF)
+        return self.dist[s].min(axis=0)
+
+    def segment(self, sources, targets):
+        s, t = self.lookup(sources), self.lookup(targets)
+        costs = self.dist[np.ix_(s, t)]
+        return Segment(sources, targets, costs, lambda i, j: self.path(s[i], t[j]))
+
+    def segments(self, pairs):
+        return [self.segment(sources, targets) for sources, targets in pairs]
+
+class SourceTrees():
+    # The shortest path trees of the most recently queried endpoints, for
+    # topologies too large for all pairs. A pair with a known endpoint is
+    # answered from its tree, and the weighted matrix is kept between
+    # queries for the others. After a change, only the trees that use a
+    # link that got more expensive, or that a cheaper link shortens, are
+    # left out of the copy for the new weights.
+    budget = 64 << 20
+    max_patch = 4096
+
+    def __init__(self, csr, sources, targets, weights, ids, index):
+        self.csr = csr
+        self.sources = sources
+        self.targets = targets
+        self.weights = weights
+        self.ids = ids
+        self.index = index
+        self.capacity = max(16, self.budget // (12 * max(csr.n, 1)))
+        self.trees = OrderedDict()
+        self.weighted = None
+        self.lock = Lock()
+
+    def matrix(self):
+        if self.weighted is None:
+            self.weighted = self.csr.matrix(self.weights)
+        return self.weighted
+
+    def sync(self, weights):
+        if weights is self.weights:
+            return self
+        changed = np.flatnonzero(weights != self.weights)
+        with self.lock:
+            trees = list(self.trees.items())
+        kept = copy(self)
+        kept.trees = OrderedDict()
+        kept.weighted = None
+        kept.weights = weights
+        kept.lock = Lock()
+        if len(changed) > self.max_patch:
+            return kept
+        u, v = self.sources[changed], self.targets[changed]
+        old, new = self.weights[changed], weights[changed]
+        for root, (dist, pred) in trees:
+            used = (pred[v] == u) | (pred[u] == v)
+            shorter = (dist[u] + new < dist[v]) | (dist[v] + new < dist[u])
+            if not (((new > old) & used).any() or ((new < old) & shorter).any()):
+                kept.trees[root] = (dist, pred)
+        return kept
+
+    def tree(self, root):
+        with self.lock:
+            if root in self.trees:
+                self.trees.move_to_end(root)
+                return self.trees[root]
+        dist, pred = dijkstra(self.matrix(), indices=root, return_predecessors=True)
+        counters.settled(dist)
+        tree = (dist, pred.astype(np.int32))
+        with self.lock:
+            self.trees[root] = tree
+            while len(self.trees) > self.capacity:
+                self.trees.popitem(last=False)
+        return tree
+
+    def search(self):
+        return CSRSearch(self.matrix(), self.ids, self.index)
+
+    def best_path(self, sources, targets):
+        if len(sources) != 1 or len(targets) != 1:
+            return self.search().best_path(sources, targets)
+        s, t = self.index[sources[0]], self.index[targets[0]]
+        with self.lock:
+            reverse = t in self.trees and s not in self.trees
+        root, leaf = (t, s) if reverse else (s, t)
+        dist, pred = self.tree(root)
+        if dist[leaf] == INF:
+            return INF, None
+        path = [self.ids[k] for k in trace(pred, leaf)]
+        if reverse:
+            path.reverse()
+        return float(dist[leaf]), path
+
+    def distances(self, sources):
+        return self.search().distances(sources)
+
+    def segment(self, sources, targets):
+        return self.search().segment(sources, targets)
+
+    def segments(self, pairs):
+        return self.search().segments(pairs)
@@ -0,0 +1,98 @@
+from trident.rql import deadline
+
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+import multiprocessing
+import numpy as np
+import os
+import tempfile
+
+def shared_dir():
+    if os.path.isdir('/dev/shm'):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+class SharedMatrix():
+    # A CSR matrix written once to a file in shared memory. Workers map it
+    # read-only instead of receiving a pickled copy with every task.
+    def __init__(self, matrix):
+        arrays = [matrix.data.astype(np.float64),
+                  matrix.indices.astype(np.int32),
+                  matrix.indptr.astype(np.int32)]
+        fd, self.filename = tempfile.mkstemp(prefix='trident-', suffix='.csr', dir=shared_dir())
+        layout = []
+        with os.fdopen(fd, 'wb') as f:
+            offset = 0
+            for array in arrays:
+                layout += [(offset, array.dtype.str, len(array))]
+                f.write(array.tobytes())
+                offset += array.nbytes
+        self.spec = (self.filename, matrix.shape, layout)
+
+    def close(self):
+        os.unlink(self.filename)
+
+def load_matrix(spec):
+    filename, shape, layout = spec
+    if os.path.getsize(filename) == 0:
+        return csr_matrix(shape)
+    buf = np.memmap(filename, mode='r')
+    data, indices, indptr = [np.frombuffer(buf, dtype, count, offset)
+                             for offset, dtype, count in layout]
+    return csr_matrix((data, indices, indptr), shape=shape)
+
+def search_costs(spec, sources, targets):
+    dist = dijkstra(load_matrix(spec), indices=sources)
+    return dist[:, targets]
+
+class PathExecutor():
+    # Spreads the single source searches of path queries over a pool of
+    # worker processes. scipy holds the GIL while it searches, so threads
+    # would not run them in parallel.
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count()
+        self.pool = None
+        self.lock = Lock()
+
+    def executor(self):
+        with self.lock:
+            if self.pool is None:
+                methods = multiprocessing.get_all_start_methods()
+                method = 'forkserver' if 'forkserver' in methods else 'spawn'
+                self.pool = ProcessPoolExecutor(self.workers,
+                                                mp_context=multiprocessing.get_context(method))
+            return self.pool
+
+    def costs(self, matrix, tasks):
+        # `tasks` holds (sources, targets) node index lists. Returns for each
+        # task the costs from every source (rows) to every target (columns).
+        pool = self.executor()
+        shared = SharedMatrix(matrix)
+        futures = []
+        try:
+            for sources, targets in tasks:
+                chunks = np.array_split(np.asarray(sources), min(len(sources), 2 * self.workers))
+                futures += [[pool.submit(search_costs, shared.spec, c.tolist(), targets)
+                             for c in chunks]]
+            costs = []
+            for fs in futures:
+                deadline.check()
+                costs += [np.vstack([f.result() for f in fs])]
+            return costs
+        finally:
+            # Chunks that did not start are not needed any more if the
+            # query gave up.
+            for fs in futures:
+                for f in fs:
+                    f.cancel()
+            shared.close()
+
+    def shutdown(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
@@ -0,0 +1,227 @@
+from trident.rql import counters, deadline
+
+from heapq import heappush, heappop
+from itertools import count
+
+import networkx as nx
+import numpy as np
+
+INF = float('inf')
+
+def dijkstra(g, sources, targets=None, weight=None, first=False):
+    # Multi-source Dijkstra over a (possibly filtered) MultiGraph. The search
+    # stops as soon as every target is settled, or the first one if `first`
+    # is set, instead of exploring the whole graph. `weight` gets the keys of
+    # the parallel edges between two nodes and returns None to hide them.
+    adj = g.adj
+    dist = {}
+    pred = {}
+    seen = {}
+    heap = []
+    c = count()
+    for s in sources:
+        if s in g and s not in seen:
+            seen[s] = 0
+            pred[s] = None
+            heappush(heap, (0, next(c), s))
+    remaining = None if targets is None else set(targets)
+    while heap:
+        d, _, u = heappop(heap)
+        if u in dist:
+            continue
+        dist[u] = d
+        if len(dist) % 1024 == 0:
+            deadline.check()
+        if remaining is not None and u in remaining:
+            remaining.discard(u)
+            if first or len(remaining) == 0:
+                break
+        for v, keys in adj[u].items():
+            if v in dist:
+                continue
+            cost = weight(u, v, keys)
+            if cost is None:
+                continue
+            vd = d + cost
+            if v not in seen or vd < seen[v]:
+                seen[v] = vd
+                pred[v] = u
+                heappush(heap, (vd, next(c), v))
+    counters.count('settled', len(dist))
+    return dist, pred
+
+def trace(pred, target):
+    path = [target]
+    while pred[path[-1]] is not None:
+        path += [pred[path[-1]]]
+    path.reverse()
+    return path
+
+def bidirectional(g, source, target, weight):
+    if source not in g or target not in g:
+        return INF, None
+    try:
+        return nx.bidirectional_dijkstra(g, source, target, weight=counters.expanding(weight))
+    except nx.NetworkXNoPath:
+        return INF, None
+
+def shortest_paths(g, source, targets, weight):
+    # Costs from one source to every target, INF for the unreachable ones,
+    # and the paths to the reachable ones.
+    if len(targets) == 0:
+        return {}, {}
+    if len(targets) == 1:
+        cost, path = bidirectional(g, source, targets[0], weight)
+        paths = {} if path is None else {targets[0]: path}
+        return {targets[0]: cost}, paths
+    dist, pred = dijkstra(g, [source], targets, weight)
+    costs = {t: dist.get(t, INF) for t in targets}
+    paths = {t: trace(pred, t) for t in targets if t in dist}
+    return costs, paths
+
+def best_path(g, sources, targets, weight):
+    # The cheapest path between any source and any target, found by a
+    # single search from all sources at once.
+    if len(sources) == 1 and len(targets) == 1:
+        return bidirectional(g, sources[0], targets[0], weight)
+    targets = set(targets)
+    if len(targets) == 0:
+        return INF, None
+    dist, pred = dijkstra(g, sources, targets, weight, first=True)
+    reached = [t for t in targets if t in dist]
+    if len(reached) == 0:
+        return INF, None
+    return dist[reached[0]], trace(pred, reached[0])
+
+def link_costs(g, path, weight):
+    adj = g.adj
+    return [weight(u, v, adj[u][v]) for u, v in zip(path[:-1], path[1:])]
+
+def k_shortest_paths(g, sources, targets, weight):
+    # Yen's algorithm: yields (cost, path) for the simple paths from any
+    # source to any target, cheapest first. Each path is only searched for
+    # when the previous one has been consumed. A spur search leaves a found
+    # path at one of its nodes, without the links that paths sharing the
+    # same prefix took from there and without the nodes of that prefix.
+    # Several sources act as a virtual first node, so paths from the other
+    # sources are spurs of it.
+    sources = [s for s in sources if s in g]
+    cost, path = best_path(g, sources, targets, weight)
+    if path is None:
+        return
+    found = [path]
+    costs = {tuple(path): link_costs(g, path, weight)}
+    seen = {tuple(path)}
+    candidates = []
+    c = count()
+    while True:
+        yield cost, path
+        last = found[-1]
+        prefix = costs[tuple(last)]
+        first = 0 if len(sources) == 1 else -1
+        for i in range(first, len(last) - 1):
+            deadline.check()
+            root = last[:i + 1]
+            if i < 0:
+                banned_links = set()
+                spurs = [s for s in sources if s not in {p[0] for p in found}]
+            else:
+                banned_links = {frozenset(p[i:i + 2]) for p in found
+                                if len(p) > i + 1 and p[:i + 1] == root}
+                spurs = [last[i]]
+            banned_nodes = set(root[:-1])
+            def spur_weight(u, v, keys):
+                if u in banned_nodes or v in banned_nodes or frozenset((u, v)) in banned_links:
+                    return None
+                return weight(u, v, keys)
+            dist, pred = dijkstra(g, spurs, targets, spur_weight, first=True)
+            reached = [t for t in targets if t in dist]
+            if len(reached) == 0:
+                continue
+            spur = trace(pred, reached[0])
+            candidate = root[:-1] + spur
+            if tuple(candidate) in seen:
+                continue
+            seen.add(tuple(candidate))
+            link = link_costs(g, candidate, weight)
+            costs[tuple(candidate)] = link
+            heappush(candidates, (sum(prefix[:max(i, 0)]) + dist[reached[0]], next(c), candidate))
+        if len(candidates) == 0:
+            return
+        cost, _, path = heappop(candidates)
+        found += [path]
+
+class Segment():
+    # The costs between the source and target waypoints of one segment, as
+    # a matrix with a row per source. Paths are only traced for the pairs
+    # that end up in the result.
+    def __init__(self, sources, targets, costs, trace):
+        self.sources = sources
+        self.targets = targets
+        self.costs = costs
+        self.trace = trace
+
+    def path(self, i, j):
+        return self.trace(i, j)
+
+def merge_segments(segments, combine=np.add, identity=0.0):
+    # Chains the segment cost matrices with min-plus products, or another
+    # `combine` with the min, keeping for every waypoint the row of its best
+    # predecessor. Returns the cost and the path of the best chain, or
+    # (INF, None).
+    costs = np.full(len(segments[0].sources), identity)
+    pointers = []
+    for segment in segments:
+        total = combine(costs[:, None], segment.costs)
+        if total.shape[0] == 0 or total.shape[1] == 0:
+            return INF, None
+        best = np.argmin(total, axis=0)
+        costs = total[best, np.arange(total.shape[1])]
+        pointers += [best]
+
+    j = int(np.argmin(costs))
+    cost = float(costs[j])
+    if cost == INF:
+        return INF, None
+    pieces = []
+    for segment, best in zip(reversed(segments), reversed(pointers)):
+        i = int(best[j])
+        pieces += [segment.path(i, j)]
+        j = i
+    path = pieces.pop()
+    while len(pieces) > 0:
+        path = path + pieces.pop()[1:]
+    return cost, path
+
+class PathSearch():
+    # Path searches over a networkx graph, or a filtered view of one.
+    # `index` maps node ids to their position in the node table.
+    def __init__(self, g, weight, index=None):
+        self.g = g
+        self.weight = weight
+        self.index = index
+
+    def best_path(self, sources, targets):
+        return best_path(self.g, sources, targets, self.weight)
+
+    def segment(self, sources, targets):
+        costs = np.full((len(sources), len(targets)), INF)
+        paths = []
+        for i, src in enumerate(sources):
+            deadline.check()
+            c, p = shortest_paths(self.g, src, targets, self.weight)
+            costs[i] = [c[t] for t in targets]
+            paths += [p]
+        return Segment(sources, targets, costs, lambda i, j: paths[i][targets[j]])
+
+    def segments(self, pairs):
+        return [self.segment(sources, targets) for sources, targets in pairs]
+
+    def distances(self, sources):
+        # The distance of every node from the closest source, as an array
+        # in node table order.
+        dist, _ = dijkstra(self.g, sources, None, self.weight)
+        result = np.full(len(self.index), INF)
+        for n, d in dist.items():
+            result[self.index[n]] = d
+        return result
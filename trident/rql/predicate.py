@@ -0,0 +1,166 @@
+from trident.rql import counters
+from trident.rql.common import BasicConstraint, VarRef, Value
+
+import numpy as np
+import operator
+
+FLIPPED = {
+    '>': '<',
+    '>=': '<=',
+    '<': '>',
+    '<=': '>=',
+    '=': '=',
+    '!=': '!=',
+}
+
+OPS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '=': operator.eq,
+    '!=': operator.ne,
+}
+
+class Operand():
+    # An operand with its column and default resolved ahead of time. Constant
+    # operands (literals, unknown properties, columns that only hold their
+    # default) are compared once instead of once per element.
+    def __init__(self, constant=True, value=None, column=None, default=None):
+        self.constant = constant
+        self.value = value
+        self.column = column
+        self.default = default
+
+    def fetch(self, candidates):
+        column = self.column
+        values = column.values[candidates]
+        if column.present is None:
+            return values
+        present = column.present[candidates]
+        if present.all():
+            return values
+        values = values.astype(object)
+        values[~present] = self.default
+        return values
+
+def compile_operand(operand, table, props):
+    if isinstance(operand, VarRef):
+        name = str(operand)
+        if name not in props:
+            return Operand(value=None)
+        default = props[name].default_value
+        column = table.columns.get(name, None)
+        if column is None:
+            return Operand(value=default)
+        if column.values is None:
+            return Operand(value=column.default)
+        return Operand(False, column=column, default=default)
+    elif isinstance(operand, Value):
+        if operand.vtype == 'param':
+            raise Exception('Parameter $%s is not bound' % (operand.value))
+        return Operand(value=operand.value)
+    else:
+        return Operand(value=operand)
+
+class Predicate():
+    # A constraint tree compiled against one table. test() maps an array of
+    # candidate indices to a boolean mask; AND/OR only evaluate their right
+    # hand side on the candidates that the left hand side left undecided.
+    # `plan` tells how each basic constraint is evaluated: with a 'hash' or
+    # 'sorted' index, as a 'scan', or once as a 'constant'.
+    def __init__(self, constraints, table, props):
+        self.plan = []
+        self.test = self.compile(constraints, table, props)
+
+    def compile(self, constraints, table, props):
+        if constraints is None:
+            return lambda c: np.ones(len(c), dtype=np.bool_)
+        elif isinstance(constraints, BasicConstraint):
+            if constraints.op not in OPS:
+                raise Exception('%s is not defined' % (constraints.op))
+            test, access = self.compile_basic(constraints.op,
+                                              compile_operand(constraints.lhs, table, props),
+                                              compile_operand(constraints.rhs, table, props))
+            self.plan += [{'constraint': str(constraints), 'access': access}]
+            return test
+        elif constraints.op == 'AND':
+            lhs = self.compile(constraints.lhs, table, props)
+            rhs = self.compile(constraints.rhs, table, props)
+            def test_and(c):
+                mask = lhs(c)
+                undecided = np.flatnonzero(mask)
+                if len(undecided) > 0:
+                    mask[undecided] = rhs(c[undecided])
+                return mask
+            return test_and
+        elif constraints.op == 'OR':
+            lhs = self.compile(constraints.lhs, table, props)
+            rhs = self.compile(constraints.rhs, table, props)
+            def test_or(c):
+                mask = lhs(c)
+                undecided = np.flatnonzero(~mask)
+                if len(undecided) > 0:
+                    mask[undecided] = rhs(c[undecided])
+                return mask
+            return test_or
+        elif constraints.op == 'NOT':
+            inner = self.compile(constraints.lhs, table, props)
+            return lambda c: ~inner(c)
+        else:
+            return lambda c: np.ones(len(c), dtype=np.bool_)
+
+    def compile_basic(self, op, lhs, rhs):
+        if lhs.constant and not rhs.constant:
+            lhs, rhs, op = rhs, lhs, FLIPPED[op]
+        if not lhs.constant and rhs.constant:
+            lookup = self.compile_lookup(op, lhs, rhs.value)
+            if lookup is not None:
+                return lookup
+        op = OPS[op]
+
+        if lhs.constant and rhs.constant:
+            result = bool(op(lhs.value, rhs.value))
+            return lambda c: np.full(len(c), result, dtype=np.bool_), 'constant'
+
+        def test(c):
+            counters.count('scanned', len(c))
+            l = lhs.value if lhs.constant else lhs.fetch(c)
+            r = rhs.value if rhs.constant else rhs.fetch(c)
+            mask = np.asarray(op(l, r), dtype=np.bool_)
+            if mask.shape != (len(c),):
+                mask = np.full(len(c), bool(mask), dtype=np.bool_)
+            return mask
+        return test, 'scan'
+
+    def compile_lookup(self, op, operand, value):
+        # Turns the scan into a point or range lookup when the column has a
+        # matching index. The candidates are always sorted, which lets the
+        # hits be mapped back onto them with a binary search.
+        column = operand.column
+        if op == '=' and 'hash' in column.index_kinds:
+            kind = 'hash'
+            found = lambda: column.index('hash').lookup(value, operand.default)
+        elif op != '!=' and 'sorted' in column.index_kinds:
+            kind = 'sorted'
+            found = lambda: column.index('sorted').lookup(op, value)
+        else:
+            return None
+
+        def test(c):
+            hits = found()
+            counters.count('index_hits', len(hits))
+            mask = np.zeros(len(c), dtype=np.bool_)
+            if len(hits) > 0:
+                pos = np.searchsorted(c, hits)
+                valid = pos < len(c)
+                pos, hits = pos[valid], hits[valid]
+                mask[pos[c[pos] == hits]] = True
+            return mask
+        return test, kind
+
+    def select(self, candidates):
+        candidates = np.asarray(candidates, dtype=np.int64)
+        if len(candidates) == 0:
+            return candidates
+        return candidates[self.test(candidates)]
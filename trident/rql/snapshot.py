@@ -0,0 +1,254 @@
+from trident.rql.common import DataSpec, Value
+from trident.rql.graph import GraphDB, Structure
+from trident.rql.store import Column, ElementTable, object_array
+
+from array import array
+
+import networkx as nx
+import numpy as np
+import json
+import mmap
+import os
+import sys
+
+# Snapshot layout:
+#
+#   magic (8 bytes) | meta length (8 bytes) | meta (JSON) | padding | blobs
+#
+# The meta section describes the topology and holds (offset, length) pairs of
+# the blobs, relative to the 8-byte aligned start of the blob section. Every
+# blob is an 8-byte aligned native array, so numeric columns of a memory-mapped
+# snapshot are used in place, without any parsing.
+MAGIC = b'RQLSNAP1'
+VERSION = 1
+SUFFIX = '.rqs'
+
+def snapshot_path(filename):
+    return os.path.splitext(filename)[0] + SUFFIX
+
+def align(n):
+    return (n + 7) & ~7
+
+class BlobWriter():
+    def __init__(self):
+        self.body = bytearray()
+
+    def add(self, data):
+        data = bytes(data)
+        offset = len(self.body)
+        self.body += data
+        self.body += bytes(align(len(self.body)) - len(self.body))
+        return [offset, len(data)]
+
+    def add_strings(self, strings):
+        encoded = [s.encode('utf-8') for s in strings]
+        offsets = array('q', [0])
+        for s in encoded:
+            offsets.append(offsets[-1] + len(s))
+        return {'offsets': self.add(offsets.tobytes()),
+                'data': self.add(b''.join(encoded))}
+
+def column_kind(column):
+    if column.dtype == np.bool_:
+        return 'B'
+    if column.dtype == np.int64:
+        return 'q'
+    if column.dtype == np.float64:
+        return 'd'
+    if column.values is None or all(type(v) is str for v in column.values):
+        return 's'
+    return 'j'
+
+def write_columns(writer, table):
+    columns = []
+    for name, column in table.columns.items():
+        kind = column_kind(column)
+        meta = {
+            'name': name,
+            'kind': kind,
+            'default': column.default,
+            'present': None,
+            'values': None,
+        }
+        if column.present is not None:
+            meta['present'] = writer.add(column.present.astype(np.uint8))
+        if column.values is None:
+            pass
+        elif kind == 's':
+            meta['values'] = writer.add_strings(column.values)
+        elif kind == 'j':
+            meta['values'] = writer.add_strings(map(json.dumps, column.values.tolist()))
+        else:
+            meta['values'] = writer.add(column.values.astype(kind))
+        columns += [meta]
+    return columns
+
+def encode_value(value):
+    if isinstance(value, Value):
+        return {'vtype': value.vtype, 'value': value.value}
+    return value
+
+def decode_value(value):
+    if isinstance(value, dict):
+        return Value(value['vtype'], value['value'])
+    return value
+
+def encode_specs(specs):
+    encoded = []
+    for spec in specs.values():
+        s = {
+            'varname': str(spec.varname),
+            'vartype': spec.vartype,
+            'default': encode_value(spec.default_value),
+        }
+        if spec.data_type == 'COST':
+            s['accum_func'] = spec.accum_func
+        if hasattr(spec, 'element_type'):
+            s['element_type'] = spec.element_type
+        encoded += [s]
+    return encoded
+
+def decode_specs(encoded):
+    specs = {}
+    for s in encoded:
+        spec = DataSpec(s['varname'], s['vartype'], decode_value(s['default']),
+                        s.get('accum_func', None))
+        if 'element_type' in s:
+            spec.element_type = s['element_type']
+        specs[spec.varname] = spec
+    return specs
+
+def write_snapshot(gdb, filename):
+    writer = BlobWriter()
+    meta = {
+        'version': VERSION,
+        'byteorder': sys.byteorder,
+        'graph': gdb.structure.attrs,
+        'nodes': {
+            'count': len(gdb.node_table),
+            'columns': write_columns(writer, gdb.node_table),
+        },
+        'edges': {
+            'count': len(gdb.edge_table),
+            'source': writer.add(gdb.sources),
+            'target': writer.add(gdb.targets),
+            'columns': write_columns(writer, gdb.edge_table),
+        },
+        'ports': {
+            'count': len(gdb.port_table),
+            'columns': write_columns(writer, gdb.port_table),
+        },
+        'specs': {
+            'NODE': encode_specs(gdb.node_prop_specs),
+            'LINK': encode_specs(gdb.edge_prop_specs),
+            'PORT': encode_specs(gdb.port_prop_specs),
+        },
+    }
+    meta = json.dumps(meta).encode('utf-8')
+    header = MAGIC + len(meta).to_bytes(8, 'little') + meta
+    header += bytes(align(len(header)) - len(header))
+
+    # Write to a temporary file first so that concurrent readers never map a
+    # half-written snapshot.
+    tmpname = '%s.%d.tmp' % (filename, os.getpid())
+    with open(tmpname, 'wb') as f:
+        f.write(header)
+        f.write(writer.body)
+    os.replace(tmpname, filename)
+
+class SnapshotReader():
+    # Numeric columns are read-only views of the mapped file; they are only
+    # copied when a SET first writes to them.
+    def __init__(self, buf, base):
+        self.buf = buf
+        self.base = base
+
+    def blob(self, ref, dtype=np.uint8):
+        offset, length = ref
+        dtype = np.dtype(dtype)
+        return np.frombuffer(self.buf, dtype, length // dtype.itemsize,
+                             self.base + offset)
+
+    def strings(self, ref):
+        offsets = self.blob(ref['offsets'], np.int64).tolist()
+        data = self.blob(ref['data']).tobytes()
+        return object_array([str(data[offsets[i]:offsets[i + 1]], 'utf-8')
+                             for i in range(len(offsets) - 1)])
+
+    def column(self, meta, size):
+        kind = meta['kind']
+        present = meta['present']
+        if present is not None:
+            present = self.blob(present).view(np.bool_)
+        values = meta['values']
+        if values is None:
+            pass
+        elif kind == 's':
+            values = self.strings(values)
+        elif kind == 'j':
+            values = object_array(list(map(json.loads, self.strings(values))))
+        elif kind == 'B':
+            values = self.blob(values).view(np.bool_)
+        else:
+            values = self.blob(values, kind)
+        dtype = {'B': np.bool_, 'q': np.int64, 'd': np.float64}.get(kind, object)
+        return Column(size, meta['default'], dtype, values, present)
+
+    def ids(self, meta):
+        column = next(c for c in meta['columns'] if c['name'] == 'id')
+        return self.column(column, meta['count']).tolist()
+
+    def table(self, meta, ids):
+        table = ElementTable(ids)
+        for column in meta['columns']:
+            table.add_column(column['name'], self.column(column, len(table)))
+        return table
+
+def read_snapshot(filename):
+    with open(filename, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mm[:8] != MAGIC:
+        raise Exception('%s is not a topology snapshot' % (filename))
+    meta_len = int.from_bytes(mm[8:16], 'little')
+    meta = json.loads(str(mm[16:16 + meta_len], 'utf-8'))
+    if meta['version'] != VERSION or meta['byteorder'] != sys.byteorder:
+        raise Exception('Incompatible topology snapshot %s' % (filename))
+    reader = SnapshotReader(mm, align(16 + meta_len))
+
+    nodes = reader.ids(meta['nodes'])
+    sources = reader.blob(meta['edges']['source'], np.int64)
+    targets = reader.blob(meta['edges']['target'], np.int64)
+
+    tables = [reader.table(meta['nodes'], nodes),
+              reader.table(meta['edges'], range(meta['edges']['count'])),
+              reader.table(meta['ports'], reader.ids(meta['ports']))]
+    specs = [decode_specs(meta['specs'][t]) for t in ['NODE', 'LINK', 'PORT']]
+    cost_specs = {name: spec for props in specs for name, spec in props.items()
+                  if spec.data_type == 'COST'}
+
+    gdb = GraphDB.__new__(GraphDB)
+    gdb.setup(Structure(nodes, sources, targets, meta['graph']), 'networkx', tables, specs,
+              cost_specs)
+    gdb.create_default_indexes()
+    return gdb
+
+def is_fresh(snapshot, source):
+    return (os.path.exists(snapshot)
+            and os.path.getmtime(snapshot) >= os.path.getmtime(source))
+
+def convert(topo_dir, force=False):
+    import glob
+    for filename in sorted(glob.glob('%s/*.graphml' % topo_dir)):
+        snapshot = snapshot_path(filename)
+        if not force and is_fresh(snapshot, filename):
+            continue
+        try:
+            gdb = GraphDB(nx.read_graphml(filename).to_undirected())
+            write_snapshot(gdb, snapshot)
+            print('%s -> %s' % (filename, snapshot))
+        except Exception as e:
+            print('Failed to convert %s: %s' % (filename, e))
+
+if __name__ == '__main__':
+    topo_dir = sys.argv[1]
+    convert(topo_dir, '--force' in sys.argv[2:])
@@ -0,0 +1,301 @@
+from collections.abc import Mapping
+
+import numpy as np
+import sys
+
+DTYPES = {
+    'int': np.int64,
+    'float': np.float64,
+    'str': object,
+}
+
+def infer_dtype(values):
+    if all(type(v) is bool for v in values):
+        return np.bool_
+    if all(type(v) is int and -2**63 <= v < 2**63 for v in values):
+        return np.int64
+    if all(type(v) is float for v in values):
+        return np.float64
+    return object
+
+def object_array(values):
+    array = np.empty(len(values), dtype=object)
+    for i, v in enumerate(values):
+        array[i] = v
+    return array
+
+def to_python(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+class HashIndex():
+    # Maps each value of a column to the set of element indices holding it.
+    # Elements that lack the property are kept apart, since they compare
+    # equal to the spec default instead.
+    def __init__(self, column):
+        self.buckets = {}
+        self.absent = set()
+        present = column.present
+        for i, v in enumerate(column.tolist()):
+            if present is not None and not present[i]:
+                self.absent.add(i)
+            else:
+                self.buckets.setdefault(v, set()).add(i)
+
+    def copy(self):
+        index = HashIndex.__new__(HashIndex)
+        index.buckets = {v: set(b) for v, b in self.buckets.items()}
+        index.absent = set(self.absent)
+        return index
+
+    def lookup(self, value, default=None):
+        found = self.buckets.get(value, set())
+        if len(self.absent) > 0 and value == default:
+            found = found | self.absent
+        return np.fromiter(found, dtype=np.int64, count=len(found))
+
+    def update(self, indices, old_values, value):
+        for i, old in zip(indices, old_values):
+            if i in self.absent:
+                self.absent.discard(i)
+            else:
+                bucket = self.buckets[old]
+                bucket.discard(i)
+                if len(bucket) == 0:
+                    del self.buckets[old]
+        self.buckets.setdefault(value, set()).update(indices)
+
+class SortedIndex():
+    # Column values in sorted order, for range lookups. Only built for
+    # numeric columns in which every element has the property.
+    def __init__(self, column):
+        values = column.array()
+        self.order = np.argsort(values, kind='stable')
+        self.keys = values[self.order]
+
+    def copy(self):
+        index = SortedIndex.__new__(SortedIndex)
+        index.order = self.order.copy()
+        index.keys = self.keys.copy()
+        return index
+
+    def lookup(self, op, value):
+        keys = self.keys
+        if op == '<':
+            return self.order[:np.searchsorted(keys, value, 'left')]
+        elif op == '<=':
+            return self.order[:np.searchsorted(keys, value, 'right')]
+        elif op == '>':
+            return self.order[np.searchsorted(keys, value, 'right'):]
+        elif op == '>=':
+            return self.order[np.searchsorted(keys, value, 'left'):]
+        elif op == '=':
+            return self.order[np.searchsorted(keys, value, 'left'):
+                              np.searchsorted(keys, value, 'right')]
+        return None
+
+    def update(self, indices, value):
+        keep = ~np.isin(self.order, indices)
+        self.order = self.order[keep]
+        self.keys = self.keys[keep]
+        pos = np.searchsorted(self.keys, value, 'right')
+        indices = np.sort(indices)
+        self.order = np.insert(self.order, pos, indices)
+        self.keys = np.insert(self.keys, pos, np.full(len(indices), value, dtype=self.keys.dtype))
+
+class Column():
+    # One property of every element in a table, stored as a typed array.
+    # `values` stays None while all elements hold `default`, and `present`
+    # stays None while all elements have the property.
+    def __init__(self, size, default, dtype=object, values=None, present=None):
+        self.size = size
+        self.default = default
+        self.dtype = np.dtype(dtype)
+        self.values = values
+        self.present = present
+        self.index_kinds = set()
+        self.hash_index = None
+        self.sorted_index = None
+
+    @staticmethod
+    def from_values(values, present=None, default=None):
+        found = values if present is None else [v for v, p in zip(values, present) if p]
+        dtype = infer_dtype(found)
+        if present is not None:
+            filler = found[0] if len(found) > 0 else None
+            values = [v if p else filler for v, p in zip(values, present)]
+            present = np.array(present, dtype=np.bool_)
+        if dtype is object:
+            array = object_array(values)
+        else:
+            array = np.array(values, dtype=dtype)
+        return Column(len(values), default, dtype, array, present)
+
+    def copy(self):
+        values = None if self.values is None else self.values.copy()
+        present = None if self.present is None else self.present.copy()
+        column = Column(self.size, self.default, self.dtype, values, present)
+        column.index_kinds = set(self.index_kinds)
+        if self.hash_index is not None:
+            column.hash_index = self.hash_index.copy()
+        if self.sorted_index is not None:
+            column.sorted_index = self.sorted_index.copy()
+        return column
+
+    def create_index(self, kind='hash'):
+        # Indexes are built on their first lookup, so that loading a topology
+        # does not pay for indexes that no query uses.
+        if kind == 'sorted':
+            if self.dtype == object or self.present is not None:
+                raise Exception('Sorted indexes need a numeric property on every element')
+        elif kind != 'hash':
+            raise Exception('Unknown index type %s' % (kind))
+        self.index_kinds.add(kind)
+
+    def index(self, kind):
+        if kind == 'hash' and 'hash' in self.index_kinds:
+            if self.hash_index is None:
+                self.hash_index = HashIndex(self)
+            return self.hash_index
+        if kind == 'sorted' and 'sorted' in self.index_kinds:
+            if self.sorted_index is None:
+                self.sorted_index = SortedIndex(self)
+            return self.sorted_index
+        return None
+
+    def has(self, i):
+        return self.present is None or bool(self.present[i])
+
+    def get(self, i, default=None):
+        if not self.has(i):
+            return default
+        if self.values is None:
+            return self.default
+        return to_python(self.values[i])
+
+    def tolist(self):
+        if self.values is None:
+            return [self.default] * self.size
+        return self.values.tolist()
+
+    def array(self):
+        if self.values is None:
+            return np.full(self.size, self.default, dtype=self.dtype)
+        return self.values
+
+    def fill(self, value):
+        self.default = value
+        self.values = None
+        self.present = None
+        self.hash_index = None
+        self.sorted_index = None
+
+    def assign(self, indices, value):
+        if len(indices) == 0:
+            return
+        if self.hash_index is not None:
+            old_values = self.array()[indices].tolist()
+        if self.values is None:
+            self.values = self.array()
+        elif not self.values.flags.writeable:
+            self.values = self.values.copy()
+        try:
+            self.values[indices] = value
+        except (TypeError, ValueError, OverflowError):
+            self.dtype = np.dtype(object)
+            self.values = self.values.astype(object)
+            self.values[indices] = value
+            self.index_kinds.discard('sorted')
+            self.sorted_index = None
+        # Index the value as stored, after numpy has cast it to the dtype.
+        stored = self.values[indices[0]]
+        if self.hash_index is not None:
+            self.hash_index.update(indices.tolist(), old_values, to_python(stored))
+        if self.sorted_index is not None:
+            self.sorted_index.update(indices, stored)
+        if self.present is not None:
+            self.present = self.present.copy()
+            self.present[indices] = True
+            if self.present.all():
+                self.present = None
+
+    def footprint(self):
+        size = sys.getsizeof(self)
+        for array in [self.values, self.present]:
+            if array is not None:
+                size += array.nbytes
+                if array.dtype == object:
+                    size += sum(map(sys.getsizeof, array))
+        if self.hash_index is not None:
+            size += sys.getsizeof(self.hash_index.buckets)
+            size += sum(map(sys.getsizeof, self.hash_index.buckets.values()))
+        if self.sorted_index is not None:
+            size += self.sorted_index.order.nbytes + self.sorted_index.keys.nbytes
+        return size
+
+class ElementTable():
+    # Nodes, links or ports of a topology. Element ids are mapped to dense
+    # indices, which address every column of the table.
+    def __init__(self, ids):
+        self.ids = list(ids)
+        self.index = {e: i for i, e in enumerate(self.ids)}
+        self.columns = {}
+        self.shared = set()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def fork(self):
+        table = ElementTable.__new__(ElementTable)
+        table.ids = self.ids
+        table.index = self.index
+        table.columns = dict(self.columns)
+        # Columns are copied on the first write after a fork, by whichever
+        # side writes first.
+        self.shared = set(self.columns)
+        table.shared = set(self.columns)
+        return table
+
+    def add_column(self, name, column):
+        self.columns[name] = column
+        self.shared.discard(name)
+
+    def create_index(self, name, kind='hash'):
+        self.writable(name).create_index(kind)
+
+    def writable(self, name):
+        if name in self.shared:
+            self.columns[name] = self.columns[name].copy()
+            self.shared.discard(name)
+        return self.columns[name]
+
+    def get(self, i, name, default=None):
+        column = self.columns.get(name, None)
+        if column is None:
+            return default
+        return column.get(i, default)
+
+    def row(self, i):
+        return {name: c.get(i) for name, c in self.columns.items() if c.has(i)}
+
+    def footprint(self):
+        size = sys.getsizeof(self.ids) + sys.getsizeof(self.index)
+        return size + sum(c.footprint() for c in self.columns.values())
+
+class ElementView(Mapping):
+    # Read-only dict-like access to the rows of a table.
+    def __init__(self, table):
+        self.table = table
+
+    def __getitem__(self, e):
+        return self.table.row(self.table.index[e])
+
+    def __iter__(self):
+        return iter(self.table.ids)
+
+    def __len__(self):
+        return len(self.table)
+
+    def __contains__(self, e):
+        return e in self.table.index
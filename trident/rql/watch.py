@@ -0,0 +1,125 @@
+from trident.rql.common import BasicConstraint, VarRef
+
+from copy import copy
+
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EPSILON = 1e-9
+
+def references(constraints):
+    if constraints is None:
+        return set()
+    if isinstance(constraints, BasicConstraint):
+        return {'.'.join(o.path) for o in [constraints.lhs, constraints.rhs]
+                if isinstance(o, VarRef)}
+    return references(constraints.lhs) | references(constraints.rhs)
+
+def link_keys(gdb, u, v):
+    # One key per unordered pair of nodes, shared by parallel links.
+    n = len(gdb.node_table)
+    return np.minimum(u, v) * n + np.maximum(u, v)
+
+class Watch():
+    # A standing WATCH query on a GraphDB. Besides its path, a watch keeps the
+    # link weights that the path was computed with, the links along the path
+    # and, for two-waypoint expressions, the distance of every node from the
+    # source and from the target waypoints. After a SET, these prove in most
+    # cases that the path is still the shortest one without searching again.
+    def __init__(self, cmd):
+        self.cmd = cmd
+        self.varname = None if cmd.varname is None else str(cmd.varname)
+        self.opt_obj = None if cmd.opt_obj is None else str(cmd.opt_obj)
+        self.references = references(cmd.constraints)
+        self.path = None
+        self.recomputations = 0
+
+    def compute(self, gdb, executor=None):
+        cmd = self.cmd
+        wpc, nc, ec = gdb.classify_constraints(cmd.ra_expr, cmd.constraints)
+        node_mask, edge_mask = gdb.filter_masks(nc, ec)
+        search = gdb.path_search(node_mask, edge_mask, cmd.opt_obj, executor)
+        found = gdb.find_waypoints(wpc)
+        waypoints = [found[wp] for wp in cmd.ra_expr.waypoints]
+        cost, self.path = gdb.find_route(search, waypoints)
+
+        self.weights = gdb.cost_weights(cmd.opt_obj)
+        self.edge_mask = edge_mask
+        self.links, self.pairs = self.path_links(gdb)
+        self.source_dist = self.target_dist = None
+        if (len(waypoints) == 2 and self.path is not None
+                and gdb.accumulation(cmd.opt_obj) == 'add'):
+            self.source_dist = search.distances(waypoints[0])
+            self.target_dist = search.distances(waypoints[1])
+        self.recomputations += 1
+
+    def path_links(self, gdb):
+        # The links between consecutive nodes of the path, including the
+        # parallel ones, and the node pair of each of them.
+        if self.path is None or len(self.path) < 2:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        index = gdb.node_table.index
+        nodes = np.array([index[n] for n in self.path], dtype=np.int64)
+        keys = link_keys(gdb, nodes[:-1], nodes[1:])
+        all_keys = link_keys(gdb, gdb.sources, gdb.targets)
+        links = np.flatnonzero(np.isin(all_keys, keys))
+        if self.edge_mask is not None:
+            links = links[self.edge_mask[links]]
+        return links, all_keys[links]
+
+    def path_cost(self, weights):
+        cost = 0.0
+        for key in np.unique(self.pairs):
+            cost += weights[self.links[self.pairs == key]].min()
+        return cost
+
+    def still_shortest(self, gdb, weights):
+        # Only the links whose weight changed since the last search matter.
+        changed = np.flatnonzero(weights != self.weights)
+        if self.edge_mask is not None:
+            changed = changed[self.edge_mask[changed]]
+        if len(changed) == 0:
+            return True
+        delta = weights[changed] - self.weights[changed]
+        on_path = np.isin(changed, self.links)
+        if (delta[on_path] > 0).any():
+            return False
+        if not (delta < 0).any():
+            # Links that only got more expensive cannot create a shorter path.
+            return True
+        if self.source_dist is None:
+            return False
+        off_path = changed[~on_path & (delta < 0)]
+        if len(off_path) == 0:
+            return True
+        # A path through a cheaper link u-v costs at least the distance to u
+        # and from v before the change, plus the new weight, minus all the
+        # other decreases it could benefit from.
+        total = -delta[delta < 0].sum()
+        decrease = self.weights[off_path] - weights[off_path]
+        u, v = gdb.sources[off_path], gdb.targets[off_path]
+        ds, dt = self.source_dist, self.target_dist
+        bound = (np.minimum(ds[u] + dt[v], ds[v] + dt[u])
+                 + weights[off_path] - (total - decrease))
+        return bool((bound >= self.path_cost(weights) - EPSILON).all())
+
+    def refresh(self, gdb, propname, executor=None):
+        # Returns the watch for `gdb`: this one if its path still holds, or
+        # else a recomputed copy, as earlier versions share this one. A watch
+        # without a path is always recomputed.
+        if propname not in self.references and self.path is not None:
+            if propname != self.opt_obj:
+                return self
+            # The bounds only hold for additive costs.
+            if (gdb.accumulation(self.opt_obj) == 'add'
+                    and self.still_shortest(gdb, gdb.cost_weights(self.opt_obj))):
+                return self
+        watch = copy(self)
+        try:
+            watch.compute(gdb, executor)
+        except Exception as e:
+            logger.warning('Failed to refresh %s: %s', self.cmd, e)
+            watch.path = None
+        return watch
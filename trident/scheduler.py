@@ -0,0 +1,83 @@
+from trident.rql.deadline import Deadline, running
+
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue, Empty
+from threading import Lock
+
+DONE = object()
+
+class Job():
+    # The results of one request, handed over from the pool thread that
+    # runs it to the request thread as they are found.
+    def __init__(self, deadline, grace):
+        self.deadline = deadline
+        self.grace = grace
+        self.items = Queue()
+        self.done = False
+
+    def results(self):
+        # Stops waiting a little after the deadline, for searches that are
+        # stuck between two checks. Closing the generator early cancels
+        # the job.
+        try:
+            while True:
+                remaining = self.deadline.remaining()
+                try:
+                    item = self.items.get(timeout=None if remaining is None else remaining + self.grace)
+                except Empty:
+                    self.deadline.exceeded = True
+                    yield {'type': 'error', 'message': 'Query deadline exceeded'}
+                    return
+                if item is DONE:
+                    self.done = True
+                    return
+                yield item
+        finally:
+            if not self.done:
+                self.deadline.cancel()
+
+class Scheduler():
+    # Runs queries on `workers` threads, so that a few expensive ones
+    # cannot hold up every request thread. At most `capacity` jobs wait for
+    # a thread, and further ones are turned away at once. Jobs give up at
+    # their deadline, including those still waiting.
+    def __init__(self, workers=4, capacity=16, timeout=60, grace=1.0):
+        self.workers = workers
+        self.capacity = capacity
+        self.timeout = timeout
+        self.grace = grace
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix='trident-query')
+        self.admitted = 0
+        self.rejected = 0
+        self.lock = Lock()
+
+    def deadline(self, timeout=None):
+        # Clients may ask for less time than `timeout`, not more.
+        if timeout is None or (self.timeout is not None and timeout > self.timeout):
+            timeout = self.timeout
+        return Deadline(timeout)
+
+    def submit(self, results, timeout=None):
+        # `results` is called on a pool thread and yields the results of
+        # the query. Returns the job, or None if too many are waiting.
+        with self.lock:
+            if self.admitted >= self.workers + self.capacity:
+                self.rejected += 1
+                return None
+            self.admitted += 1
+        job = Job(self.deadline(timeout), self.grace)
+        self.pool.submit(self.run, job, results)
+        return job
+
+    def run(self, job, results):
+        try:
+            with running(job.deadline):
+                job.deadline.check()
+                for item in results():
+                    job.items.put(item)
+        except Exception as e:
+            job.items.put({'type': 'error', 'message': str(e)})
+        finally:
+            job.items.put(DONE)
+            with self.lock:
+                self.admitted -= 1
@@ -0,0 +1,57 @@
+from collections import OrderedDict
+from threading import Lock
+
+import secrets
+import time
+
+class SessionManager():
+    # Client sessions created by `factory`, keyed by an opaque token. A
+    # session idle for more than `timeout` seconds is closed and forgotten
+    # with its variables, and so is the least recently used one when there
+    # are more than `capacity`. The topologies they loaded stay in the
+    # topology cache for the other sessions.
+    def __init__(self, factory, timeout=1800, capacity=1024):
+        self.factory = factory
+        self.timeout = timeout
+        self.capacity = capacity
+        self.sessions = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, token=None):
+        # Returns the token and the session, which is a new one when the
+        # token is unknown or expired.
+        now = time.monotonic()
+        closed = []
+        with self.lock:
+            closed += self.expire(now)
+            entry = None if token is None else self.sessions.get(token, None)
+            if entry is None:
+                token = secrets.token_urlsafe(18)
+                entry = [self.factory(), now]
+                self.sessions[token] = entry
+                while len(self.sessions) > self.capacity:
+                    closed += [self.sessions.popitem(last=False)[1][0]]
+            entry[1] = now
+            self.sessions.move_to_end(token)
+        for session in closed:
+            session.close()
+        return token, entry[0]
+
+    def expire(self, now):
+        expired = []
+        while len(self.sessions) > 0:
+            token, (session, last_used) = next(iter(self.sessions.items()))
+            if now - last_used <= self.timeout:
+                break
+            del self.sessions[token]
+            expired += [session]
+        return expired
+
+    def drop(self, token):
+        with self.lock:
+            entry = self.sessions.pop(token, None)
+        if entry is not None:
+            entry[0].close()
+
+    def __len__(self):
+        return len(self.sessions)